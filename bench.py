@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for claude-dj's hot paths.
+
+    python3 bench.py transport      # native bus connection vs dbus-send
+    python3 bench.py index          # words.json vs compact words.idx
+    python3 bench.py build          # index build scaling, 1..N processes
+    python3 bench.py lrc            # LRC parsing throughput
+
+Anything that needs Spotify runs against fake_mpris on a private bus, so
+these work on a headless box.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from mpris import Connection, DbusSendTransport, NativeTransport
+
+
+@contextmanager
+def fake_spotify(load_delay: float = 0.0):
+    """A private dbus-daemon with a FakePlayer on it. Yields the player."""
+    from fake_mpris import FakePlayer, start_private_bus
+
+    bus, address = start_private_bus()
+    old = os.environ.get("DBUS_SESSION_BUS_ADDRESS")
+    os.environ["DBUS_SESSION_BUS_ADDRESS"] = address
+    conn = None
+    try:
+        conn = Connection.open(address)
+        player = FakePlayer(conn, load_delay).start()
+        player._do_OpenUri("spotify:track:4cOdK2wGLETKBW3PvgPWqT")
+        yield player
+    finally:
+        if conn:
+            conn.close()
+        bus.terminate()
+        bus.wait()
+        if old is None:
+            os.environ.pop("DBUS_SESSION_BUS_ADDRESS", None)
+        else:
+            os.environ["DBUS_SESSION_BUS_ADDRESS"] = old
+
+
+def timed(fn, n: int) -> list:
+    """Run fn n times, return per-call times in ms."""
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+
+def report(label: str, times: list):
+    times = sorted(times)
+    p95 = times[int(len(times) * 0.95) - 1] if len(times) > 1 else times[0]
+    print(f"  {label:<34} mean {statistics.mean(times):8.3f} ms   "
+          f"p50 {statistics.median(times):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def bench_transport(args):
+    """now_playing-style reads: 3 separate Gets vs one GetAll snapshot."""
+    def three_gets(t):
+        return lambda: (t.get_property("Metadata"),
+                        t.get_property("PlaybackStatus"),
+                        t.get_property("Position"))
+
+    with fake_spotify():
+        native = NativeTransport()
+        native.connection()  # connect outside the timed loop
+        dbus_send = DbusSendTransport()
+        slow_n = max(args.n // 10, 5)
+        print(f"now_playing reads ({args.n} native / {slow_n} dbus-send runs)")
+        report("native, 3x Get", timed(three_gets(native), args.n))
+        report("native, GetAll", timed(native.player_state, args.n))
+        report("dbus-send, 3x Get", timed(three_gets(dbus_send), slow_n))
+        report("dbus-send, GetAll", timed(dbus_send.player_state, slow_n))
+        native.close()
+
+
+def synthetic_words(n_words: int, n_tracks: int = 500, seed: int = 1) -> dict:
+    """A words.json-shaped index with realistic repetition, for benchmarking."""
+    rng = random.Random(seed)
+    tracks = [(f"Artist {i % 200}", f"Track {i}", f"spotify:track:{i:022d}") for i in range(n_tracks)]
+    lines = [f"this is lyric line {i} of some song, oh oh" for i in range(n_tracks * 40)]
+    index = {}
+    for w in range(n_words):
+        entries = []
+        for _ in range(min(int(rng.paretovariate(1.2)), 400)):
+            artist, track, uri = rng.choice(tracks)
+            entries.append({"artist": artist, "track": track, "uri": uri,
+                            "time": round(rng.uniform(0, 240), 2),
+                            "line": rng.choice(lines), "duration": 1.5})
+        index[f"word{w}"] = entries
+    return index
+
+
+# Runs in a fresh interpreter so RSS isn't polluted by the parent
+_INDEX_PROBE = """
+import sys, time
+sys.path.insert(0, {here!r})
+from word_index import WordIndex
+
+def rss():
+    for line in open("/proc/self/status"):
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) * 1024
+    return 0
+
+before = rss()
+index = WordIndex({json_path!r}, {idx_path!r})
+t0 = time.perf_counter()
+data = index.data()
+load_ms = (time.perf_counter() - t0) * 1000
+after = rss()
+keys = {keys!r}
+t0 = time.perf_counter()
+for key in keys:
+    data.get(key)
+lookup_us = (time.perf_counter() - t0) * 1e6 / len(keys)
+print(load_ms, after - before, lookup_us)
+"""
+
+
+def bench_index(args):
+    """Load time, RSS and lookup cost: words.json vs compact words.idx."""
+    from word_index import convert_json
+
+    here = str(Path(__file__).parent)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(args.words) if args.words else Path(tmp) / "words.json"
+        if not args.words:
+            json_path.write_text(json.dumps(synthetic_words(args.synthetic), indent=2))
+        idx_path = Path(tmp) / "words.idx"
+        convert_json(json_path, idx_path)
+        keys = random.Random(2).sample(sorted(json.loads(json_path.read_text())), 200)
+
+        print(f"{json_path.stat().st_size / 1e6:.1f}MB JSON, {idx_path.stat().st_size / 1e6:.1f}MB compact")
+        for label, idx in (("words.json", None), ("words.idx", str(idx_path))):
+            code = _INDEX_PROBE.format(here=here, json_path=str(json_path), idx_path=idx, keys=keys)
+            out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+            load_ms, rss, lookup_us = map(float, out.stdout.split())
+            print(f"  {label:<12} load {load_ms:9.1f} ms   RSS +{rss / 1e6:7.1f} MB   "
+                  f"lookup {lookup_us:7.1f} us")
+
+
+def synthetic_lrc(directory: Path, n_songs: int, n_lines: int = 40, seed: int = 3):
+    """A directory of .lrc files with [uri:] tags, so a build needs no network."""
+    rng = random.Random(seed)
+    vocab = [f"word{i}" for i in range(20_000)]
+    for i in range(n_songs):
+        lines = [f"[uri:spotify:track:{i:022d}]"]
+        for j in range(n_lines):
+            text = " ".join(rng.choice(vocab) for _ in range(rng.randint(3, 9)))
+            lines.append(f"[{j * 4 // 60:02d}:{j * 4 % 60:02d}.{rng.randint(0, 99):02d}] {text}")
+        (directory / f"Artist {i % 500} - Track {i}.lrc").write_text("\n".join(lines))
+
+
+def bench_build(args):
+    """Offline index build from local .lrc files, 1..N processes."""
+    here = Path(__file__).parent
+    counts = [1]
+    while counts[-1] * 2 <= args.processes:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != args.processes:
+        counts.append(args.processes)
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = Path(tmp) / "lrc"
+        corpus.mkdir()
+        synthetic_lrc(corpus, args.songs)
+        print(f"{args.songs} songs, {os.cpu_count()} cores")
+        baseline, outputs = None, set()
+        for processes in counts:
+            out = Path(tmp) / f"words{processes}.json"
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, str(here / "build_words_v2.py"), "--offline",
+                            "--songs", str(corpus), "--output", str(out),
+                            "--processes", str(processes)],
+                           check=True, stdout=subprocess.DEVNULL)
+            elapsed = time.perf_counter() - t0
+            baseline = baseline or elapsed
+            outputs.add(out.read_bytes())
+            print(f"  {processes:>3} process(es)   {elapsed:7.2f} s   "
+                  f"{args.songs / elapsed:8.0f} songs/s   speedup {baseline / elapsed:4.2f}x")
+        print("  outputs identical" if len(outputs) == 1 else "  OUTPUTS DIFFER")
+
+
+def synthetic_lrc_text(rng, n_lines: int = 60) -> str:
+    """One song of LRC in the shapes LRCLIB serves: header tags, plain lines,
+    some enhanced (<mm:ss.xx> per word), some choruses with two timestamps."""
+    vocab = ["love", "tonight", "baby", "fire", "heart", "dream", "world", "hello", "oh", "yeah"]
+    out = ["[ar:Artist]", "[ti:Title]", ""]
+    if rng.random() < 0.1:
+        out.insert(2, "[offset:+120]")
+    t = rng.uniform(2, 10)
+    for _ in range(n_lines):
+        t += rng.uniform(1.5, 5)
+        stamp = f"[{int(t // 60):02d}:{t % 60:05.2f}]"
+        words = [rng.choice(vocab) for _ in range(rng.randint(0, 9))]
+        kind = rng.random()
+        if kind < 0.15:
+            tags, w = [], t
+            for word in words:
+                tags.append(f"<{int(w // 60):02d}:{w % 60:05.2f}> {word}")
+                w += 0.3
+            out.append(f"{stamp} {' '.join(tags)}")
+        elif kind < 0.25:
+            again = t + 60
+            out.append(f"{stamp}[{int(again // 60):02d}:{again % 60:05.2f}] {' '.join(words)}")
+        else:
+            out.append(f"{stamp} {' '.join(words)}")
+    return "\n".join(out)
+
+
+def naive_parse(synced: str) -> list:
+    """
+    The per-call parser this replaced (uncompiled re.match, a dict per
+    line). It only understands plain [mm:ss.xx] lines, so it does less work
+    than the real parser on this corpus (and gets the other lines wrong).
+    """
+    import re
+    lines = []
+    for line in synced.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        match = re.match(r'\[(\d+:\d+\.\d+)\]\s*(.*)', line)
+        if match:
+            minutes, seconds = match.group(1).split(":")
+            text = match.group(2).strip()
+            if text:
+                lines.append({"time": int(minutes) * 60 + float(seconds), "text": text})
+    return lines
+
+
+def bench_lrc(args):
+    """LRC parsing throughput on a synthetic corpus."""
+    import tracemalloc
+    from lyrics import iter_synced, parse_synced
+
+    rng = random.Random(5)
+    corpus = [synthetic_lrc_text(rng) for _ in range(args.songs)]
+    n_bytes = sum(len(text) for text in corpus)
+    n_lines = sum(text.count("\n") + 1 for text in corpus)
+    print(f"{args.songs} songs, {n_lines} lines, {n_bytes / 1e6:.1f} MB")
+
+    def stream(text):
+        for _ in iter_synced(text):
+            pass
+
+    for label, parse in (("naive", naive_parse), ("parse_synced", parse_synced),
+                         ("iter_synced", stream)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            for text in corpus:
+                parse(text)
+            best = min(best, time.perf_counter() - t0)
+        tracemalloc.start()
+        kept = [parse(text) for text in corpus[:1000]]
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del kept
+        print(f"  {label:<13} {best * 1000:8.1f} ms   {n_lines / best / 1e6:5.2f} M lines/s   "
+              f"{n_bytes / best / 1e6:6.1f} MB/s   peak {peak / 1e6:6.1f} MB per 1000 songs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="claude-dj benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("transport", help=bench_transport.__doc__)
+    p.add_argument("-n", type=int, default=200)
+    p.set_defaults(func=bench_transport)
+
+    p = sub.add_parser("index", help=bench_index.__doc__)
+    p.add_argument("--words", help="words.json to use (default: synthetic)")
+    p.add_argument("--synthetic", type=int, default=8367, help="words in the synthetic index")
+    p.set_defaults(func=bench_index)
+
+    p = sub.add_parser("build", help=bench_build.__doc__)
+    p.add_argument("--songs", type=int, default=5000, help="synthetic .lrc files to index")
+    p.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="largest pool to try")
+    p.set_defaults(func=bench_build)
+
+    p = sub.add_parser("lrc", help=bench_lrc.__doc__)
+    p.add_argument("--songs", type=int, default=5000, help="synthetic songs to parse")
+    p.add_argument("--repeat", type=int, default=3, help="runs per parser (best is reported)")
+    p.set_defaults(func=bench_lrc)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,18 +4,35 @@ Build a word index from song lyrics - V2.
 Auto-searches for Spotify URIs so we just need artist + track names.
 """
 
+import argparse
+import bisect
+import hashlib
 import json
 import re
 import time
-import urllib.request
-import urllib.parse
+from collections import Counter
 from pathlib import Path
-from collections import defaultdict
+from concurrent.futures import (ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+
+import ratelimit
+from httppool import get_client
+from lyrics import LyricsUnavailable, get_synced_lyrics
+from lyrics import get_cache as get_lyrics_cache
+from sources import iter_songs, read_lrc
+from search import UriCache, lookup_uri, song_query
+from storage import atomic_write
+from word_index import CompactIndex, IndexWriter, write_run
 
 WORDS_FILE = Path(__file__).parent / "words.json"
+WORDS_INDEX_FILE = Path(__file__).parent / "words.idx"
 CACHE_FILE = Path(__file__).parent / "uri_cache.json"
+CACHE_JOURNAL_FILE = Path(__file__).parent / "uri_cache.journal"
+# What went into words.json, per song, for --incremental
+MANIFEST_FILE = Path(__file__).parent / "words_manifest.json"
 
-# Just artist + track name - we'll find URIs automatically
+# Just artist + track name - we'll find URIs automatically.
+# This is the "builtin" source; see sources.py for reading others.
 SONGS = [
     # 80s classics
     ("Queen", "We Are The Champions"),
@@ -489,7 +506,6 @@ SONGS = [
     ("Passion Pit", "Sleepyhead"),
     ("Walk The Moon", "Shut Up And Dance"),
     ("Bastille", "Pompeii"),
-    ("Hozier", "Take Me To Church"),
     ("Mumford And Sons", "Little Lion Man"),
     ("Mumford And Sons", "I Will Wait"),
     ("The Lumineers", "Ho Hey"),
@@ -624,154 +640,559 @@ SONGS = [
 ]
 
 def load_cache():
-    if CACHE_FILE.exists():
-        return json.loads(CACHE_FILE.read_text())
-    return {}
+    """
+    The URI cache shared with the MCP (search.UriCache over uri_cache.json
+    plus uri_cache.journal). Every lookup is appended to the journal as it
+    happens, so an interrupted build keeps what it found.
+    """
+    return UriCache(CACHE_FILE, CACHE_JOURNAL_FILE)
 
 def save_cache(cache):
-    CACHE_FILE.write_text(json.dumps(cache, indent=2))
-
-def search_uri(artist, track, cache):
-    """Search for Spotify URI via DuckDuckGo."""
-    key = f"{artist}|{track}"
-    if key in cache:
-        return cache[key]
+    cache.compact()
 
+def search_uri(artist, track, cache, offline=False):
+    """
+    Cached, retried URI lookup. Network failures aren't cached; an expired
+    entry is used if the lookup fails.
+    """
+    query = song_query(artist, track)
     try:
-        query = urllib.parse.quote(f"{artist} {track} spotify track")
-        url = f"https://html.duckduckgo.com/html/?q={query}"
+        return cache.resolve(query, lambda q: uri_retry(lookup_uri, q), offline)
+    except OSError as e:
+        print(f"    Search error: {e}")
+        return cache.peek(query)
 
-        req = urllib.request.Request(url, headers={
-            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36'
-        })
+def lyric_dicts(lines):
+    """(time, text, word_times) tuples -> the {"time", "text"[, "words"]} dicts used here."""
+    out = []
+    for t, text, word_times in lines:
+        line = {"time": t, "text": text}
+        if word_times:
+            line["words"] = word_times
+        out.append(line)
+    return out
 
-        with urllib.request.urlopen(req, timeout=10) as response:
-            html = response.read().decode('utf-8')
+_NOT_WORD = re.compile(r"[^\w\s'-]")
 
-        pattern = r'open\.spotify\.com/track/([a-zA-Z0-9]+)'
-        matches = re.findall(pattern, html)
+def extract_words(text):
+    text = _NOT_WORD.sub("", text.lower())
+    words = text.split()
+    return [w.strip("'-") for w in words if w.strip("'-")]
 
-        if matches:
-            uri = f"spotify:track:{matches[0]}"
-            cache[key] = uri
-            return uri
-    except Exception as e:
-        print(f"    Search error: {e}")
+# ============ PIPELINE ============
 
-    cache[key] = None
-    return None
+# Requests per second (and burst) per host. The old serial loop slept
+# 0.3-0.5s per song; these keep us about as polite while letting the two
+# hosts work in parallel.
+RATES = {"html.duckduckgo.com": (2.0, 2), "lrclib.net": (4.0, 4)}
 
-def fetch_lyrics(artist, track):
-    """Fetch synced lyrics from LRCLIB."""
+uri_retry = ratelimit.Retrying(retry_on=(OSError,))
+lyrics_retry = ratelimit.Retrying(retry_on=(LyricsUnavailable,))
+
+
+def song_uri(song, cache, offline=False):
+    return song.uri or search_uri(song.artist, song.track, cache, offline)
+
+def song_lyrics(song, offline=False):
+    """Lyrics from the song's .lrc file, else LRCLIB (only its cache when offline)."""
+    if song.lrc_path:
+        return read_local_lyrics(song.lrc_path)
+    if offline:
+        found, lines = get_lyrics_cache().get(song.artist, song.track)
+        return lyric_dicts(lines or [])
+    return fetch_song_lyrics(song.artist, song.track)
+
+def read_local_lyrics(path):
+    """Parse a .lrc file (runs in the process pool for local sources)."""
     try:
-        query = urllib.parse.urlencode({
-            "artist_name": artist,
-            "track_name": track
-        })
-        url = f"https://lrclib.net/api/get?{query}"
-
-        req = urllib.request.Request(url, headers={
-            'User-Agent': 'claude-dj/1.0'
-        })
-
-        with urllib.request.urlopen(req, timeout=10) as response:
-            data = json.loads(response.read().decode('utf-8'))
-
-        synced = data.get("syncedLyrics", "")
-        if not synced:
-            return []
-
-        lines = []
-        for line in synced.split("\n"):
-            line = line.strip()
-            if not line:
-                continue
-            match = re.match(r'\[(\d+):(\d+\.\d+)\]\s*(.*)', line)
-            if match:
-                mins = int(match.group(1))
-                secs = float(match.group(2))
-                timestamp = mins * 60 + secs
-                text = match.group(3).strip()
-                if text:
-                    lines.append({"time": timestamp, "text": text})
-
-        return lines
-    except:
+        _, lines = read_lrc(path)
+    except OSError as e:
+        print(f"    Can't read {path}: {e}")
         return []
+    return lyric_dicts(lines)
 
-def extract_words(text):
-    text = re.sub(r"[^\w\s'-]", "", text.lower())
-    words = text.split()
-    return [w.strip("'-") for w in words if w.strip("'-")]
+def resolve_song(song, cache, offline=False, defer_local=False):
+    """
+    (uri, lyrics) for one song; either may be None/[]. With defer_local,
+    lyrics of .lrc songs are left as None for an index worker to read.
+    """
+    uri = song_uri(song, cache, offline)
+    if not uri:
+        return None, []
+    if defer_local and song.lrc_path:
+        return uri, None
+    return uri, song_lyrics(song, offline)
 
-def main():
-    print(f"Processing {len(SONGS)} songs...\n")
+def fetch_song_lyrics(artist, track):
+    try:
+        lines = lyrics_retry(get_synced_lyrics, artist, track)
+    except LyricsUnavailable as e:
+        print(f"    Lyrics error: {e}")
+        return []
+    return lyric_dicts(lines)
 
-    cache = load_cache()
-    word_index = defaultdict(list)
+def resolve_serial(songs, cache, on_done, offline=False, defer_local=False):
+    """One song at a time - the reference the pipeline has to match."""
+    for i, song in enumerate(songs):
+        on_done(i, *resolve_song(song, cache, offline, defer_local))
 
-    success = 0
-    no_uri = 0
-    no_lyrics = 0
+def resolve_concurrent(songs, cache, on_done, workers, offline=False, defer_local=False):
+    """
+    URI lookups and lyrics fetches as two overlapping thread-pool stages.
 
-    for i, (artist, track) in enumerate(SONGS):
-        print(f"[{i+1}/{len(SONGS)}] {artist} - {track}")
+    A song's lyrics fetch is queued as soon as its URI is known, so
+    DuckDuckGo and LRCLIB are busy at the same time. Local .lrc files are
+    parsed in a process pool instead, one process per core. on_done(i,
+    uri, lyrics) runs on the calling thread, in whatever order songs
+    finish. With defer_local, .lrc songs are handed over with lyrics None
+    for an index worker to read.
+    """
+    uris = {}
+    with ThreadPoolExecutor(workers, thread_name_prefix="uri") as uri_pool, \
+         ThreadPoolExecutor(workers, thread_name_prefix="lyrics") as lyrics_pool, \
+         ProcessPoolExecutor() as lrc_pool:
+        pending = {uri_pool.submit(song_uri, song, cache, offline): ("uri", i)
+                   for i, song in enumerate(songs)}
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, i = pending.pop(future)
+                song = songs[i]
+                if stage == "lyrics":
+                    on_done(i, uris.pop(i), future.result())
+                elif not future.result():
+                    on_done(i, None, [])
+                elif defer_local and song.lrc_path:
+                    on_done(i, future.result(), None)
+                else:
+                    uris[i] = future.result()
+                    if song.lrc_path:
+                        job = lrc_pool.submit(read_local_lyrics, song.lrc_path)
+                    else:
+                        job = lyrics_pool.submit(song_lyrics, song, offline)
+                    pending[job] = ("lyrics", i)
 
-        # Get URI
-        uri = search_uri(artist, track, cache)
-        if not uri:
-            print("    No URI found")
-            no_uri += 1
-            time.sleep(0.5)
-            continue
+# ============ WORD TIMING ============
 
-        # Get lyrics
-        lyrics = fetch_lyrics(artist, track)
-        if not lyrics:
-            print(f"    No lyrics ({uri})")
-            no_lyrics += 1
-            time.sleep(0.3)
-            continue
+# Lines only have a start time, so a word's position is estimated: from
+# enhanced-LRC <mm:ss.xx> tags when the lyrics have them, otherwise by
+# spreading the line's syllables evenly up to the next line.
+SYLLABLE_SEC = 0.35     # caps a line's span when the next line is far off
+WORD_LEAD = 0.1         # start the clip a bit early, the estimate is rough
+WORD_TAIL = 0.25
+MIN_WORD_CLIP = 0.5
+MAX_WORD_CLIP = 1.5
+
+_TOKEN = re.compile(r"\S+")
+_VOWELS = re.compile(r"[aeiouy]+", re.IGNORECASE)
+
+def syllables(token):
+    """Rough syllable count: vowel groups, or length/3 for other scripts."""
+    return len(_VOWELS.findall(token)) or max(1, len(token) // 3)
+
+def token_times(line, end):
+    """
+    [(token, start, end)] for each whitespace-separated token of a line.
+
+    end is when the next line starts (None for the last line).
+    """
+    start, word_times = line["time"], line.get("words")
+    if word_times:
+        text = "".join(part for _, part in word_times)
+        anchors, pos = [], 0
+        for t, part in word_times:
+            anchors.append((pos, t))
+            pos += len(part)
+        last = word_times[-1]
+        line_end = last[0] + syllables(last[1]) * SYLLABLE_SEC
+        if end is not None:
+            line_end = min(line_end, end)
+        anchors.append((len(text), max(line_end, last[0])))
+        positions = [p for p, _ in anchors]
+
+        def time_at(p):
+            i = max(bisect.bisect_right(positions, p) - 1, 0)
+            if i >= len(anchors) - 1:
+                return anchors[-1][1]
+            (p0, t0), (p1, t1) = anchors[i], anchors[i + 1]
+            return t0 + (t1 - t0) * (p - p0) / max(p1 - p0, 1)
+
+        return [(m.group(), time_at(m.start()), time_at(m.end()))
+                for m in _TOKEN.finditer(text)]
+
+    tokens = line["text"].split()
+    weights = [syllables(token) for token in tokens]
+    total = sum(weights) or 1
+    span = total * SYLLABLE_SEC
+    if end is not None:
+        span = min(span, end - start)
+    span = max(span, 0)
+    out, done = [], 0
+    for token, weight in zip(tokens, weights):
+        out.append((token, start + span * done / total, start + span * (done + weight) / total))
+        done += weight
+    return out
+
+# ============ VARIANT SCORES ============
+
+# How good a clip each posting makes, 0-1, so dj_say can play the best
+# variant without the agent paging through dj_word_info. Variants are
+# stored best first.
+ISOLATION_WEIGHT = 0.35  # a pause (punctuation, line edge) on each side
+POSITION_WEIGHT = 0.2    # near the start or end of the line
+LENGTH_WEIGHT = 0.2      # short lines: less of the neighbours bleeds in
+CHORUS_WEIGHT = 0.25     # the line repeats in the song: it's the hook
+CHORUS_REPEATS = 4       # repeats at which the chorus bonus is full
+
+_PAUSE = re.compile(r"[,.;:!?)\]\"—–-]$")
+
+def posting_score(tokens, i, repeats):
+    """
+    Score of the word at tokens[i] (a line split on whitespace), where the
+    line occurs `repeats` times in the song.
+    """
+    n = len(tokens)
+    before = i == 0 or bool(_PAUSE.search(tokens[i - 1]))
+    after = i == n - 1 or bool(_PAUSE.search(tokens[i]))
+    isolation = (before + after) / 2
+    position = 1 - 2 * min(i, n - 1 - i) / n
+    length = 1 / (1 + max(n - 3, 0) / 4)
+    chorus = min(repeats - 1, CHORUS_REPEATS - 1) / (CHORUS_REPEATS - 1)
+    score = (ISOLATION_WEIGHT * isolation + POSITION_WEIGHT * position
+             + LENGTH_WEIGHT * length + CHORUS_WEIGHT * chorus)
+    # Whole thousandths, so words.json and words.idx agree exactly
+    return int(round(score * 1000)) / 1000
+
+def line_repeats(lyrics):
+    """How often each line's words occur in the song (chorus detection)."""
+    return Counter(tuple(extract_words(line["text"])) for line in lyrics)
 
-        print(f"    {len(lyrics)} lines")
-        success += 1
+def score_entries(word, entries):
+    """
+    entries sorted best first, scoring the ones that have no "score"
+    (indexes built before scores). Repeats are estimated from the word's
+    own entries: each time a line is sung it yields one posting per
+    occurrence of the word.
+    """
+    if all("score" in entry for entry in entries):
+        return entries
+    postings = Counter((entry["uri"], entry["line"]) for entry in entries)
+    scored = []
+    for entry in entries:
+        score = entry.get("score")
+        if score is None:
+            tokens = entry["line"].split()
+            hits = [i for i, token in enumerate(tokens) if word in extract_words(token)]
+            if hits:
+                repeats = max(postings[entry["uri"], entry["line"]] // len(hits), 1)
+                score = max(posting_score(tokens, i, repeats) for i in hits)
+            else:
+                score = 0.0
+            entry = {**entry, "score": score}
+        scored.append(entry)
+    return sorted(scored, key=lambda entry: -entry["score"])
 
-        # Index words
-        for line in lyrics:
-            words = extract_words(line["text"])
-            for word in words:
+def posting_rank(entry, song_rank):
+    """IndexWriter sort key: best score first, then catalogue order."""
+    return (-int(round(entry.get("score", 0) * 1000)), song_rank)
+
+# ============ POSTINGS ============
+
+def song_postings(artist, track, uri, lyrics):
+    """(word, entry) for every indexable word of a song, in lyric order."""
+    repeats = line_repeats(lyrics)
+    for n, line in enumerate(lyrics):
+        end = lyrics[n + 1]["time"] if n + 1 < len(lyrics) else None
+        line_cs = int(round(line["time"] * 100))
+        times = token_times(line, end)
+        tokens = [token for token, _, _ in times]
+        line_repeat = repeats[tuple(extract_words(line["text"]))]
+        for i, (token, word_start, word_end) in enumerate(times):
+            for word in extract_words(token):
                 if len(word) < 2:
                     continue
-                word_index[word].append({
+                # Whole centiseconds, so words.json and words.idx agree exactly
+                start_cs = max(line_cs, int(round((word_start - WORD_LEAD) * 100)))
+                clip = word_end + WORD_TAIL - start_cs / 100
+                clip_cs = int(round(min(max(clip, MIN_WORD_CLIP), MAX_WORD_CLIP) * 100))
+                yield word, {
                     "artist": artist,
                     "track": track,
                     "uri": uri,
-                    "time": round(line["time"], 2),
+                    "time": start_cs / 100,
                     "line": line["text"],
-                    "duration": 1.5
-                })
+                    "duration": clip_cs / 100,
+                    "offset": (start_cs - line_cs) / 100,
+                    "score": posting_score(tokens, i, line_repeat),
+                }
+
+def index_song(writer, artist, track, uri, lyrics, rank):
+    """Add one song's postings to an IndexWriter."""
+    for word, entry in song_postings(artist, track, uri, lyrics):
+        writer.add(word, entry, posting_rank(entry, rank))
+
+# ============ MAP-REDUCE ============
+
+def index_shard(shard, run_path):
+    """
+    Map step, in a worker process: tokenize a batch of songs into one
+    sorted run file. Songs without lyrics (None) are read from their .lrc
+    file here, so local corpora are parsed in parallel too.
+
+    shard is [(i, rank, artist, track, uri, lyrics, lrc_path)]; returns
+    [(i, line count, lyrics hash)].
+    """
+    postings, results = [], []
+    for i, rank, artist, track, uri, lyrics, lrc_path in shard:
+        if lyrics is None:
+            lyrics = read_local_lyrics(lrc_path)
+        for word, entry in song_postings(artist, track, uri, lyrics):
+            postings.append((word, posting_rank(entry, rank), len(postings), entry))
+        results.append((i, len(lyrics), lyrics_hash(lyrics) if lyrics else None))
+    write_run(run_path, postings)
+    return results
+
+class ShardedIndexer:
+    """
+    Spreads tokenizing and posting construction over a process pool.
+
+    Songs are batched into shards of shard_size; each shard becomes one
+    sorted run (index_shard) that the IndexWriter k-way merges with the
+    others at finish (reduce). At most two shards per process are in
+    flight, so memory stays bounded however big the corpus is.
+    on_indexed(i, line count, lyrics hash) is called as shards complete.
+    """
+
+    def __init__(self, writer, processes, on_indexed, shard_size=200):
+        self.writer = writer
+        self.processes = processes
+        self.on_indexed = on_indexed
+        self.shard_size = shard_size
+        self.pool = ProcessPoolExecutor(processes)
+        self.shard = []
+        self.running = {}
+
+    def add(self, i, rank, artist, track, uri, lyrics, lrc_path=None):
+        self.shard.append((i, rank, artist, track, uri, lyrics, lrc_path))
+        if len(self.shard) >= self.shard_size:
+            self._submit()
+
+    def _submit(self):
+        if len(self.running) >= 2 * self.processes:
+            self._collect(FIRST_COMPLETED)
+        path = self.writer.run_path()
+        self.running[self.pool.submit(index_shard, self.shard, path)] = path
+        self.shard = []
+
+    def _collect(self, return_when):
+        finished, _ = wait(self.running, return_when=return_when)
+        for future in finished:
+            self.writer.add_run(self.running.pop(future))
+            for result in future.result():
+                self.on_indexed(*result)
+
+    def finish(self):
+        if self.shard:
+            self._submit()
+        if self.running:
+            self._collect(ALL_COMPLETED)
+        self.pool.shutdown()
+
+# ============ INCREMENTAL ============
+
+def song_key(artist, track):
+    return f"{artist}|{track}"
+
+def lyrics_hash(lyrics):
+    # Word timings only count when present, so plain-LRC hashes stay stable
+    data = json.dumps([[line["time"], line["text"], *([line["words"]] if "words" in line else [])]
+                       for line in lyrics], ensure_ascii=False)
+    return hashlib.sha1(data.encode()).hexdigest()
+
+def load_manifest():
+    """song key -> {uri, lyrics_hash, indexed_at} for the songs in words.json"""
+    if MANIFEST_FILE.exists() and WORDS_FILE.exists():
+        return json.loads(MANIFEST_FILE.read_text())
+    return None
 
-        time.sleep(0.3)  # Be nice to APIs
+def save_manifest(manifest):
+    atomic_write(MANIFEST_FILE, json.dumps(manifest, indent=2))
+
+def plan_incremental(songs, manifest, cache):
+    """
+    (songs to fetch, keys to drop from the index) given the last manifest.
+
+    New songs are fetched. Songs already indexed are only re-fetched if
+    what's available locally (URI cache, lyrics cache, the .lrc file)
+    disagrees with the manifest - checking that costs no network requests.
+    """
+    current = {song_key(song.artist, song.track) for song in songs}
+    drop = {key for key in manifest if key not in current}
+    todo = []
+    lyrics_cache = get_lyrics_cache()
+    for song in songs:
+        key = song_key(song.artist, song.track)
+        entry = manifest.get(key)
+        if entry is not None:
+            uri = song.uri or cache.peek(song_query(song.artist, song.track), entry["uri"])
+            if uri != entry["uri"]:
+                drop.add(key)
+            elif entry["uri"] is None:
+                continue
+            else:
+                if song.lrc_path:
+                    lyrics = read_local_lyrics(song.lrc_path)
+                else:
+                    found, lines = lyrics_cache.get(song.artist, song.track)
+                    if not found:
+                        continue
+                    lyrics = lyric_dicts(lines or [])
+                if (lyrics_hash(lyrics) if lyrics else None) == entry["lyrics_hash"]:
+                    continue
+                drop.add(key)
+        todo.append(song)
+    return todo, drop
+
+def carry_over(writer, drop, ranks):
+    """
+    Feed the previous build's postings (minus dropped songs) to the writer,
+    one word at a time from words.idx rather than loading words.json.
+    """
+    if WORDS_INDEX_FILE.exists():
+        previous = CompactIndex(WORDS_INDEX_FILE)
+    else:
+        previous = json.loads(WORDS_FILE.read_text())
+    for word in previous.keys():
+        for entry in previous[word]:
+            if song_key(entry["artist"], entry["track"]) not in drop:
+                rank = ranks.get((entry["artist"], entry["track"]), len(ranks))
+                writer.add(word, entry, posting_rank(entry, rank))
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the word index")
+    parser.add_argument("--songs", action="append", metavar="SOURCE",
+                        help="where to read songs from: 'builtin' (SONGS in this file), a "
+                             ".csv/.jsonl/.json/.m3u file or a directory of .lrc files. "
+                             "Repeatable; default builtin")
+    parser.add_argument("--offline", action="store_true",
+                        help="no network: URIs and lyrics only from caches and .lrc files")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="concurrent lookups per stage (1 = old serial loop)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="tokenize and build postings in this many processes (map-reduce)")
+    parser.add_argument("--output", type=Path,
+                        help="where to write words.json (words.idx and the manifest go next to it)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch songs added or changed since the last build")
+    args = parser.parse_args()
+
+    for host, (rate, burst) in RATES.items():
+        ratelimit.set_rate(host, rate, burst)
+    if args.output:
+        global WORDS_FILE, WORDS_INDEX_FILE, MANIFEST_FILE
+        WORDS_FILE = args.output
+        WORDS_INDEX_FILE = args.output.with_suffix(".idx")
+        MANIFEST_FILE = args.output.with_name(args.output.stem + "_manifest.json")
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+
+    duplicates = []
+    catalogue = list(iter_songs(args.songs or ["builtin"], SONGS, duplicates))
+    for song in duplicates:
+        print(f"Skipping duplicate: {song.artist} - {song.track}")
+
+    cache = load_cache()
+    manifest = load_manifest() if args.incremental else None
+    ranks = {(song.artist, song.track): i for i, song in enumerate(catalogue)}
+    writer = IndexWriter(tmp_dir=WORDS_FILE.parent)
+    if manifest is not None:
+        songs, drop = plan_incremental(catalogue, manifest, cache)
+        removed = len(manifest.keys() - {song_key(song.artist, song.track) for song in catalogue})
+        print(f"Incremental: {len(songs)} new or changed, {removed} removed, "
+              f"{len(catalogue) - len(songs)} unchanged")
+        carry_over(writer, drop, ranks)
+        for key in drop:
+            manifest.pop(key, None)
+    else:
+        if args.incremental:
+            print("No manifest from a previous build, doing a full build")
+        songs, manifest = catalogue, {}
+    print(f"Processing {len(songs)} songs with {args.workers} worker(s)...\n")
+    started = time.perf_counter()
+    indexed_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    counts = {"done": 0, "success": 0, "no_uri": 0, "no_lyrics": 0}
+
+    def record(i, uri, n_lines, digest):
+        artist, track = songs[i].artist, songs[i].track
+        counts["done"] += 1
+        print(f"[{counts['done']}/{len(songs)}] {artist} - {track}")
+        if not uri:
+            print("    No URI found")
+            counts["no_uri"] += 1
+        elif not n_lines:
+            print(f"    No lyrics ({uri})")
+            counts["no_lyrics"] += 1
+        else:
+            print(f"    {n_lines} lines")
+            counts["success"] += 1
+        manifest[song_key(artist, track)] = {
+            "uri": uri,
+            "lyrics_hash": digest,
+            "indexed_at": indexed_at,
+        }
+
+    sharded = None
+    uris = {}  # songs handed to the sharded indexer
+    if args.processes > 1:
+        sharded = ShardedIndexer(writer, args.processes,
+                                 lambda i, n_lines, digest: record(i, uris.pop(i), n_lines, digest))
+
+    def on_done(i, uri, lyrics):
+        song = songs[i]
+        if not uri:
+            record(i, None, 0, None)
+        elif sharded:
+            # lyrics None: the worker reads the .lrc file itself
+            uris[i] = uri
+            sharded.add(i, ranks[(song.artist, song.track)], song.artist, song.track,
+                        uri, lyrics, song.lrc_path)
+        else:
+            index_song(writer, song.artist, song.track, uri, lyrics, ranks[(song.artist, song.track)])
+            record(i, uri, len(lyrics), lyrics_hash(lyrics) if lyrics else None)
 
-        # Save cache periodically
-        if i % 20 == 0:
-            save_cache(cache)
+    if args.workers <= 1:
+        resolve_serial(songs, cache, on_done, args.offline, defer_local=bool(sharded))
+    else:
+        resolve_concurrent(songs, cache, on_done, args.workers, args.offline,
+                           defer_local=bool(sharded))
+    if sharded:
+        sharded.finish()
 
     save_cache(cache)
+    elapsed = time.perf_counter() - started
 
-    # Save word index
-    output = {k: v for k, v in sorted(word_index.items())}
-    with open(WORDS_FILE, 'w') as f:
-        json.dump(output, f, indent=2)
+    # Save word index (words.idx is the compact, memory-mappable copy dj_mcp prefers)
+    merge_started = time.perf_counter()
+    written = writer.finish(WORDS_FILE, WORDS_INDEX_FILE)
+    save_manifest(manifest)
+    merge_elapsed = time.perf_counter() - merge_started
 
     print(f"\n{'='*50}")
-    print(f"Done!")
-    print(f"  Successful: {success}")
-    print(f"  No URI: {no_uri}")
-    print(f"  No lyrics: {no_lyrics}")
-    print(f"  Unique words: {len(word_index)}")
-    print(f"  Total entries: {sum(len(v) for v in word_index.values())}")
-    print(f"\nSaved to {WORDS_FILE}")
+    print(f"Done in {elapsed:.1f}s ({len(songs) / max(elapsed, 1e-9):.1f} songs/s)")
+    print(f"  Successful: {counts['success']}")
+    print(f"  No URI: {counts['no_uri']}")
+    print(f"  No lyrics: {counts['no_lyrics']}")
+    print(f"  Merged {written['runs']} run(s) and wrote the index in {merge_elapsed:.1f}s")
+    print(f"  Unique words: {written['words']}")
+    print(f"  Total entries: {written['entries']}")
+    http = get_client().stats()
+    for host, info in ratelimit.stats().items():
+        conn = http.get(host)
+        pooled = (f", {conn['connects']} connection(s), {conn['avg_ms']:.0f}ms avg"
+                  if conn else "")
+        print(f"  {host}: {info['requests']} requests, {info['waited']:.1f}s rate-limited{pooled}")
+    print(f"  Retries: {uri_retry.retries} search, {lyrics_retry.retries} lyrics "
+          f"({uri_retry.failures + lyrics_retry.failures} gave up)")
+    print(f"\nSaved to {WORDS_FILE} and {WORDS_INDEX_FILE}")
 
 if __name__ == "__main__":
     main()
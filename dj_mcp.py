@@ -9,237 +9,330 @@ Not just a music player - a way for Claude to EXPRESS things through music.
 - Set the mood for the moment
 """
 
-import subprocess
+import functools
+import os
 import time
 import threading
-import json
-import re
-import urllib.request
-import urllib.parse
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
+import anyio
+import anyio.to_thread
 from mcp.server.fastmcp import FastMCP
 
+import ratelimit
+from build_words_v2 import extract_words, score_entries
+from httppool import get_client as get_http_client
+from library import open_library
+from lyrics import (LyricsUnavailable, TimedLyrics, fetch_synced_lyrics, get_synced_lyrics,
+                    get_cache as get_lyrics_cache)
+from mpris import MprisError, PlayerCache, open_transport
+from scheduler import Scheduler
+from search import SEARCH_HOST, get_cache as get_uri_cache, song_query
+from word_index import WordIndex
+
 mcp = FastMCP("claude-dj")
 
+# Tools are async on FastMCP's event loop, and each one's blocking work
+# (D-Bus waits, HTTP lookups, loading the index) runs on a worker thread,
+# so a slow lyrics lookup doesn't hold up a dj_pause. Quick controls and
+# slow tools get separate thread pools, so a burst of lookups can't queue
+# the controls either.
+QUICK = anyio.CapacityLimiter(8)
+SLOW = anyio.CapacityLimiter(8)
+
+
+def tool(limiter):
+    """
+    Register a blocking function as an async MCP tool that runs it on a
+    worker thread. The function itself stays plain, for other tools to call.
+    """
+    def register(fn):
+        @functools.wraps(fn)
+        async def run(**kwargs):
+            return await anyio.to_thread.run_sync(functools.partial(fn, **kwargs),
+                                                  limiter=limiter)
+        mcp.tool()(run)
+        return fn
+    return register
+
+
 # Track library path
 TRACKS_FILE = Path(__file__).parent / "tracks.json"
 WORDS_FILE = Path(__file__).parent / "words.json"
-
-SPOTIFY_DEST = "org.mpris.MediaPlayer2.spotify"
-MPRIS_PATH = "/org/mpris/MediaPlayer2"
-PLAYER_IFACE = "org.mpris.MediaPlayer2.Player"
-PROPS_IFACE = "org.freedesktop.DBus.Properties"
-
-
-def dbus_call(method: str, *args) -> str:
-    """Call a D-Bus method on Spotify."""
-    cmd = [
-        "dbus-send", "--print-reply",
-        f"--dest={SPOTIFY_DEST}",
-        MPRIS_PATH,
-        f"{PLAYER_IFACE}.{method}"
-    ]
-    cmd.extend(args)
+WORDS_INDEX_FILE = Path(__file__).parent / "words.idx"
+
+# Loaded on first use and kept in memory; reloads when the file changes.
+# Uses the compact words.idx when there is one, words.json otherwise.
+word_index = WordIndex(WORDS_FILE, WORDS_INDEX_FILE)
+# Same for tracks.json; dj_save writes it behind, batching saves
+library = open_library(TRACKS_FILE)
+
+# How long to wait for Spotify to switch tracks / land a seek before giving up
+READY_TIMEOUT = float(os.environ.get("CLAUDE_DJ_READY_TIMEOUT", "5.0"))
+# A seek counts as landed once the position is within this window of the target
+SEEK_TOLERANCE = 1.0
+
+# Opened on first use - see mpris.open_transport for how it's picked
+_transport = None
+_player_cache = None
+# Tools run on several threads at once
+_init_lock = threading.Lock()
+
+# Owns every timed stop/seek; events in the PLAYBACK group belong to the
+# snippet currently playing and get cancelled when something replaces it
+scheduler = Scheduler()
+PLAYBACK = "playback"
+
+
+def get_transport():
+    """The shared MPRIS transport (persistent bus connection if possible)."""
+    global _transport
+    with _init_lock:
+        if _transport is None:
+            _transport = open_transport()
+    return _transport
+
+
+def dbus_call(method: str, signature: str = "", *args) -> str:
+    """Call an MPRIS Player method on Spotify. Returns "" or an error message."""
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-        return result.stdout or result.stderr
-    except subprocess.TimeoutExpired:
-        return "Timeout waiting for Spotify"
-    except Exception as e:
+        get_transport().call(method, signature, *args)
+        return ""
+    except MprisError as e:
         return f"Error: {e}"
 
 
-def dbus_get_property(prop: str) -> str:
-    """Get a property from Spotify via D-Bus."""
-    cmd = [
-        "dbus-send", "--print-reply",
-        f"--dest={SPOTIFY_DEST}",
-        MPRIS_PATH,
-        f"{PROPS_IFACE}.Get",
-        f"string:{PLAYER_IFACE}",
-        f"string:{prop}"
-    ]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-        return result.stdout or result.stderr
-    except Exception as e:
-        return f"Error: {e}"
+def get_player_cache() -> PlayerCache:
+    """Signal-fed player state shared by every tool."""
+    global _player_cache
+    transport = get_transport()
+    with _init_lock:
+        if _player_cache is None:
+            _player_cache = PlayerCache(transport)
+    return _player_cache
 
 
-def parse_metadata(raw: str) -> dict:
-    """Parse D-Bus metadata output into a dict."""
-    info = {}
-    lines = raw.split('\n')
-
-    for i, line in enumerate(lines):
-        if 'xesam:title' in line:
-            for j in range(i+1, min(i+3, len(lines))):
-                if 'string "' in lines[j]:
-                    info['title'] = lines[j].split('string "')[1].rstrip('"')
-                    break
-        elif 'xesam:artist' in line:
-            for j in range(i+1, min(i+5, len(lines))):
-                if 'string "' in lines[j]:
-                    info['artist'] = lines[j].split('string "')[1].rstrip('"')
-                    break
-        elif 'xesam:album' in line:
-            for j in range(i+1, min(i+3, len(lines))):
-                if 'string "' in lines[j]:
-                    info['album'] = lines[j].split('string "')[1].rstrip('"')
-                    break
-        elif 'mpris:trackid' in line:
-            for j in range(i+1, min(i+3, len(lines))):
-                if 'string "' in lines[j]:
-                    info['uri'] = lines[j].split('string "')[1].rstrip('"')
-                    break
-        elif 'mpris:length' in line:
-            for j in range(i+1, min(i+3, len(lines))):
-                if 'int64' in lines[j] or 'uint64' in lines[j]:
-                    try:
-                        # Length in microseconds
-                        us = int(lines[j].split()[-1])
-                        info['length_sec'] = us / 1_000_000
-                    except:
-                        pass
-                    break
-    return info
-
-
-def parse_status(raw: str) -> str:
-    """Parse playback status from D-Bus output."""
-    if 'string "Playing"' in raw:
-        return "Playing"
-    elif 'string "Paused"' in raw:
-        return "Paused"
-    elif 'string "Stopped"' in raw:
-        return "Stopped"
-    return "Unknown"
+def get_player_state(fresh: bool = False):
+    """Player snapshot (metadata, status, position...).
+
+    Comes from the signal-fed cache when it's warm, otherwise one GetAll
+    round-trip. fresh=True always asks Spotify. Returns None if Spotify
+    can't be reached.
+    """
+    try:
+        return get_player_cache().state(fresh)
+    except MprisError:
+        return None
 
 
 def get_position_sec() -> float:
     """Get current playback position in seconds."""
-    raw = dbus_get_property("Position")
-    for line in raw.split('\n'):
-        if 'int64' in line or 'uint64' in line:
-            try:
-                return int(line.split()[-1]) / 1_000_000
-            except:
-                pass
-    return 0.0
-
-
-def seek_to(seconds: float):
-    """Seek to absolute position (seconds from start)."""
-    microseconds = int(seconds * 1_000_000)
-    # SetPosition needs trackid and position
-    meta_raw = dbus_get_property("Metadata")
-    info = parse_metadata(meta_raw)
-    trackid = info.get('uri', '')
-
-    if trackid:
-        cmd = [
-            "dbus-send", "--print-reply",
-            f"--dest={SPOTIFY_DEST}",
-            MPRIS_PATH,
-            f"{PLAYER_IFACE}.SetPosition",
-            f"objpath:{trackid}",
-            f"int64:{microseconds}"
-        ]
-        subprocess.run(cmd, capture_output=True, timeout=5)
-
-
-def stop_after_delay(delay_sec: float):
-    """Stop playback after a delay (runs in background thread)."""
-    time.sleep(delay_sec)
-    dbus_call("Pause")
+    state = get_player_state()
+    return state.position_sec if state else 0.0
+
+
+def track_version():
+    """PlayerCache.track_version(), None if Spotify can't be reached."""
+    try:
+        return get_player_cache().track_version()
+    except MprisError:
+        return None
+
+
+def wait_for_track(uri: str, previous_trackid: str = "", timeout: float = READY_TIMEOUT,
+                   track_after: int = None):
+    """
+    Wait until Spotify has actually switched to `uri` after OpenUri.
+
+    For track URIs that means mpris:trackid matches; for albums/playlists
+    any track change counts. Pass track_version() from before the OpenUri
+    as track_after so a state from before it doesn't count (matters when
+    the track was already loaded). Returns the ready state, or None on
+    timeout.
+    """
+    if uri.startswith("spotify:track:"):
+        ready = lambda state: state.uri == uri
+    else:
+        ready = lambda state: bool(state.trackid) and state.trackid != previous_trackid
+    try:
+        return get_player_cache().wait_for(ready, timeout, track_after=track_after)
+    except MprisError:
+        return None
+
+
+def wait_for_seek(start_sec: float, trackid: str, timeout: float = READY_TIMEOUT):
+    """
+    Seek to start_sec and wait until the position confirms it landed.
+
+    Spotify sometimes drops a SetPosition that arrives while the track is
+    still buffering, so the seek is re-sent every half second until it
+    sticks. Returns the confirmed state, or None on timeout.
+    """
+    target_us = int(start_sec * 1_000_000)
+    landed = lambda state: (state.trackid == trackid and
+                            start_sec - 0.05 <= state.position_sec <= start_sec + SEEK_TOLERANCE)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            dbus_call("SetPosition", "ox", trackid, target_us)
+            remaining = deadline - time.monotonic()
+            state = get_player_cache().wait_for(landed, min(0.5, max(remaining, 0)))
+            if state or remaining <= 0.5:
+                return state
+    except MprisError:
+        return None
+
+
+def prepare_track(uri: str, start_sec: float = None, timeout: float = READY_TIMEOUT) -> dict:
+    """
+    Open `uri` and (optionally) seek to start_sec, waiting for each step to
+    actually happen instead of sleeping a fixed amount.
+
+    Returns per-phase timings in seconds ('load', 'seek') plus 'ready',
+    which is False if a phase ran into the deadline.
+    """
+    timings = {"ready": True}
+    before = get_player_state()
+    if before and uri.startswith("spotify:track:") and before.uri == uri:
+        # Already loaded. OpenUri would restart it from 0 - possibly after
+        # the seek below had landed - so only seek.
+        state = before
+    else:
+        previous = before.trackid if before else ""
+        loaded = track_version()
+        t0 = time.monotonic()
+        dbus_call("OpenUri", "s", uri)
+        state = wait_for_track(uri, previous, timeout, loaded)
+        timings["load"] = time.monotonic() - t0
+        if state is None:
+            timings["ready"] = False
+            return timings
+
+    # No need to seek if it's already there (a freshly loaded track sits at ~0s)
+    if start_sec is not None and not (start_sec <= state.position_sec <= start_sec + SEEK_TOLERANCE):
+        t1 = time.monotonic()
+        remaining = max(timeout - timings.get("load", 0), 0.5)
+        if wait_for_seek(start_sec, state.trackid, remaining) is None:
+            timings["ready"] = False
+        timings["seek"] = time.monotonic() - t1
+    return timings
+
+
+def describe_timings(timings: dict) -> str:
+    """'loaded in 0.12s, seeked in 0.05s' (+ a warning if it timed out)."""
+    parts = [f"{verb} in {timings[phase]:.2f}s"
+             for phase, verb in (("load", "loaded"), ("seek", "seeked")) if phase in timings]
+    if "load" not in timings:
+        parts.insert(0, "already loaded")
+    if not timings.get("ready", True):
+        parts.append(f"not confirmed within {READY_TIMEOUT:.0f}s")
+    return ", ".join(parts)
+
+
+# Bumped by every cancel_pending, so a sequence clip that was already
+# loading when the sequence got cancelled can tell, and not start playing
+playback_generation = 0
+_playback_lock = threading.Lock()
+
+
+def cancel_pending() -> int:
+    """Drop scheduled stops/seeks left over from the previous snippet."""
+    global playback_generation
+    with _playback_lock:
+        playback_generation += 1
+        return scheduler.cancel_group(PLAYBACK)
 
 
 # ============ BASIC CONTROLS ============
 
-@mcp.tool()
+@tool(QUICK)
 def dj_play() -> str:
     """Start/resume playback."""
+    cancel_pending()
     result = dbus_call("Play")
     if "Error" in result or "not provided" in result:
         return "Failed - is Spotify running?"
     return "Playing!"
 
 
-@mcp.tool()
+@tool(QUICK)
 def dj_pause() -> str:
     """Pause playback."""
+    cancel_pending()
     result = dbus_call("Pause")
     if "Error" in result or "not provided" in result:
         return "Failed - is Spotify running?"
     return "Paused"
 
 
-@mcp.tool()
+@tool(QUICK)
 def dj_toggle() -> str:
     """Toggle between play and pause."""
+    cancel_pending()
     result = dbus_call("PlayPause")
     if "Error" in result or "not provided" in result:
         return "Failed - is Spotify running?"
-    status_raw = dbus_get_property("PlaybackStatus")
-    return f"Toggled! Now: {parse_status(status_raw)}"
+    # The PropertiesChanged signal may still be in flight, so ask directly
+    state = get_player_state(fresh=True)
+    return f"Toggled! Now: {state.status if state else 'Unknown'}"
 
 
-@mcp.tool()
+@tool(QUICK)
 def dj_next() -> str:
     """Skip to next track."""
+    cancel_pending()
     dbus_call("Next")
     return "Skipped to next track"
 
 
-@mcp.tool()
+@tool(QUICK)
 def dj_previous() -> str:
     """Go to previous track."""
+    cancel_pending()
     dbus_call("Previous")
     return "Back to previous track"
 
 
 # ============ INFO ============
 
-@mcp.tool()
+@tool(QUICK)
 def dj_now_playing() -> str:
     """Get info about the currently playing track including position."""
-    raw = dbus_get_property("Metadata")
-    if "Error" in raw or "not provided" in raw:
+    state = get_player_state()
+    if state is None:
         return "Spotify is not running or no track loaded"
 
-    info = parse_metadata(raw)
-    if not info:
+    if not state.metadata:
         return "No track info available"
 
-    status_raw = dbus_get_property("PlaybackStatus")
-    status = parse_status(status_raw)
-    position = get_position_sec()
-
     parts = []
-    if 'title' in info:
-        parts.append(f"Track: {info['title']}")
-    if 'artist' in info:
-        parts.append(f"Artist: {info['artist']}")
-    if 'album' in info:
-        parts.append(f"Album: {info['album']}")
-
-    length = info.get('length_sec', 0)
+    if state.title:
+        parts.append(f"Track: {state.title}")
+    if state.artist:
+        parts.append(f"Artist: {state.artist}")
+    if state.album:
+        parts.append(f"Album: {state.album}")
+
+    position = state.position_sec
+    length = state.length_sec
     if length:
         parts.append(f"Position: {position:.1f}s / {length:.1f}s")
     else:
         parts.append(f"Position: {position:.1f}s")
 
-    parts.append(f"Status: {status}")
+    parts.append(f"Status: {state.status}")
 
-    if 'uri' in info:
-        parts.append(f"URI: {info['uri']}")
+    if state.uri:
+        parts.append(f"URI: {state.uri}")
 
     return "\n".join(parts)
 
 
 # ============ EXPRESSIVE CONTROLS ============
 
-@mcp.tool()
+@tool(SLOW)
 def dj_open(uri: str) -> str:
     """
     Open a Spotify URI to play a track, album, or playlist.
@@ -250,24 +343,20 @@ def dj_open(uri: str) -> str:
     - spotify:album:xxx
     - spotify:playlist:xxx
     """
-    cmd = [
-        "dbus-send", "--print-reply",
-        f"--dest={SPOTIFY_DEST}",
-        MPRIS_PATH,
-        f"{PLAYER_IFACE}.OpenUri",
-        f"string:{uri}"
-    ]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-        if "Error" in result.stderr:
-            return f"Failed: {result.stderr}"
-        time.sleep(0.5)  # Let it load
-        return f"Now playing: {uri}"
-    except Exception as e:
-        return f"Error: {e}"
-
-
-@mcp.tool()
+    cancel_pending()
+    before = get_player_state()
+    loaded = track_version()
+    t0 = time.monotonic()
+    result = dbus_call("OpenUri", "s", uri)
+    if result:
+        return f"Failed: {result}"
+    state = wait_for_track(uri, before.trackid if before else "", track_after=loaded)
+    if state is None:
+        return f"Opened {uri} (Spotify hasn't confirmed the switch yet)"
+    return f"Now playing: {uri} (loaded in {time.monotonic() - t0:.2f}s)"
+
+
+@tool(SLOW)
 def dj_seek(seconds: float) -> str:
     """
     Seek to a specific position in the current track.
@@ -275,13 +364,15 @@ def dj_seek(seconds: float) -> str:
     Args:
         seconds: Position to seek to (e.g., 45.5 for 45.5 seconds in)
     """
-    seek_to(seconds)
-    time.sleep(0.2)
-    actual = get_position_sec()
+    state = get_player_state()
+    if state is None or not state.trackid:
+        return "Nothing to seek - is Spotify playing anything?"
+    landed = wait_for_seek(seconds, state.trackid)
+    actual = landed.position_sec if landed else get_position_sec()
     return f"Seeked to {actual:.1f}s"
 
 
-@mcp.tool()
+@tool(SLOW)
 def dj_snippet(uri: str, start_sec: float, duration_sec: float) -> str:
     """
     Play a specific snippet of a song - perfect for quoting a chorus,
@@ -295,33 +386,23 @@ def dj_snippet(uri: str, start_sec: float, duration_sec: float) -> str:
     Example: Play the chorus of a song starting at 1:30 for 15 seconds
         dj_snippet("spotify:track:xxx", 90, 15)
     """
-    # Open the track
-    cmd = [
-        "dbus-send", "--print-reply",
-        f"--dest={SPOTIFY_DEST}",
-        MPRIS_PATH,
-        f"{PLAYER_IFACE}.OpenUri",
-        f"string:{uri}"
-    ]
-    subprocess.run(cmd, capture_output=True, timeout=5)
-    time.sleep(1.0)  # Let track load
-
-    # Seek to start position
-    seek_to(start_sec)
-    time.sleep(0.3)
+    # A new snippet replaces the old one - don't let its stop cut this one short
+    cancel_pending()
+
+    # Open the track and seek, waiting only as long as Spotify actually needs
+    timings = prepare_track(uri, start_sec)
 
     # Make sure we're playing
     dbus_call("Play")
 
     # Schedule stop after duration
-    stop_thread = threading.Thread(target=stop_after_delay, args=(duration_sec,))
-    stop_thread.daemon = True
-    stop_thread.start()
+    scheduler.after(duration_sec, lambda: dbus_call("Pause"), f"pause {uri}", PLAYBACK)
 
-    return f"Playing snippet: {start_sec}s to {start_sec + duration_sec}s ({duration_sec}s)"
+    return (f"Playing snippet: {start_sec}s to {start_sec + duration_sec}s ({duration_sec}s)"
+            f" [{describe_timings(timings)}]")
 
 
-@mcp.tool()
+@tool(SLOW)
 def dj_drop(uri: str, start_sec: float = 0, duration_sec: float = 8) -> str:
     """
     Drop a musical moment - like a mic drop but with music!
@@ -340,41 +421,106 @@ def dj_drop(uri: str, start_sec: float = 0, duration_sec: float = 8) -> str:
     return dj_snippet(uri, start_sec, duration_sec)
 
 
-@mcp.tool()
+@tool(QUICK)
 def dj_position() -> str:
     """Get current playback position in seconds."""
     pos = get_position_sec()
     return f"Position: {pos:.1f} seconds"
 
 
+@tool(QUICK)
+def dj_pending() -> str:
+    """Show scheduled player events (e.g. when the current snippet stops)."""
+    pending = scheduler.pending()
+    if not pending:
+        return "Nothing scheduled"
+    lines = [f"  in {delay:.1f}s: {label}" for delay, label, _ in pending]
+    return f"{len(pending)} scheduled:\n" + "\n".join(lines)
+
+
+@tool(QUICK)
+def dj_stats() -> str:
+    """Internal stats: which D-Bus transport is in use and how often the
+    player-state cache answers without asking Spotify."""
+    stats = get_player_cache().stats()
+    lines = [f"Transport: {get_transport().name}",
+             f"Player cache: {'subscribed' if stats.pop('subscribed') else 'polling only'}, "
+             f"hit rate {stats.pop('hit_rate'):.0%}"]
+    lines += [f"  {k}: {v}" for k, v in stats.items()]
+    lines.append(f"Scheduler: {len(scheduler.pending())} pending, {scheduler.fired} fired, "
+                 f"{scheduler.cancelled} cancelled, {scheduler.errors} failed")
+    words = word_index.stats()
+    lines.append(f"Word index ({words['format']}): {words['words']} words, {words['entries']} entries, "
+                 f"loaded {words['loads']}x (last took {words['load_ms']:.0f}ms), "
+                 f"{words['file_bytes'] / 1e6:.1f}MB on disk, ~{words['memory_bytes'] / 1e6:.1f}MB in memory")
+    lyr = get_lyrics_cache().stats()
+    lines.append(f"Lyrics cache: hit rate {lyr['hit_rate']:.0%} ({lyr['memory_hits']} memory, "
+                 f"{lyr['disk_hits']} disk, {lyr['negative_hits']} of them 'no lyrics'), "
+                 f"{lyr['misses']} misses, {lyr['expired']} expired, {lyr['evictions']} evicted")
+    uris = get_uri_cache().stats()
+    lines.append(f"URI cache: {uris['entries']} entries, hit rate {uris['hit_rate']:.0%} "
+                 f"({uris['negative_hits']} of them 'no match'), {uris['lookups']} searches, "
+                 f"{uris['coalesced']} coalesced, {uris['errors']} failed")
+    lib = library.stats()
+    lines.append(f"Library: {lib['tracks']} tracks, loaded {lib['loads']}x, {lib['saves']} saves "
+                 f"in {lib['writes']} writes, {lib['pending']} pending")
+    if warmup["state"] == "done":
+        lines.append(f"Warm-up: done in {warmup['seconds']:.1f}s, lyrics for "
+                     f"{warmup['lyrics']}/{warmup['songs']} library songs "
+                     f"({warmup['failed']} couldn't reach LRCLIB)")
+    else:
+        lines.append(f"Warm-up: {warmup['state']}")
+    lines.append(f"Ranked variants: {len(_scored[1])} words kept, "
+                 f"{scored_counters['hits']} hits, {scored_counters['misses']} misses")
+    for host, http in get_http_client().stats().items():
+        lines.append(f"HTTP {host}: {http['requests']} requests over {http['connects']} connection(s), "
+                     f"{http['avg_ms']:.0f}ms avg, {http['max_ms']:.0f}ms max, {http['errors']} failed")
+    return "\n".join(lines)
+
+
 # ============ TRACK LIBRARY ============
 
 def load_tracks() -> dict:
-    """Load tracks from JSON file."""
-    if TRACKS_FILE.exists():
-        try:
-            return json.loads(TRACKS_FILE.read_text())
-        except:
-            return {}
-    return {}
+    """The resident track library (only re-read when tracks.json changes)."""
+    return library.data()
 
 
 def load_words() -> dict:
-    """Load word index from JSON file."""
-    if WORDS_FILE.exists():
-        try:
-            return json.loads(WORDS_FILE.read_text())
-        except:
-            return {}
-    return {}
-
-
-def save_tracks(tracks: dict):
-    """Save tracks to JSON file."""
-    TRACKS_FILE.write_text(json.dumps(tracks, indent=2))
-
-
-@mcp.tool()
+    """The resident word index (only re-read when words.json changes)."""
+    return word_index.data()
+
+
+# Ranked variants per word, kept until the index reloads, so a word that
+# dj_prepare (or an earlier call) already looked up plays without decoding
+# and sorting its entries again
+SCORED_CACHE_SIZE = 512
+_scored = (None, OrderedDict())  # (index they came from, word -> entries)
+_scored_lock = threading.Lock()
+scored_counters = {"hits": 0, "misses": 0}
+
+
+def scored_entries(word: str, words) -> list:
+    """score_entries(word, words[word]), remembered for the loaded index."""
+    global _scored
+    with _scored_lock:
+        if _scored[0] is not words:
+            _scored = (words, OrderedDict())
+        cache = _scored[1]
+        entries = cache.get(word)
+        if entries is not None:
+            cache.move_to_end(word)
+            scored_counters["hits"] += 1
+            return entries
+        scored_counters["misses"] += 1
+    entries = score_entries(word, words[word])
+    with _scored_lock:
+        cache[word] = entries
+        if len(cache) > SCORED_CACHE_SIZE:
+            cache.popitem(last=False)
+    return entries
+
+
+@tool(QUICK)
 def dj_find(query: str) -> str:
     """
     Find a track URI from your personal library.
@@ -394,20 +540,25 @@ def dj_find(query: str) -> str:
     if query_lower in tracks:
         return tracks[query_lower]
 
-    # Fuzzy match - find keys containing query
-    matches = [(k, v) for k, v in tracks.items() if query_lower in k]
+    # Fuzzy match - find keys containing query (n-gram index, best first)
+    search = library.search()
+    matches = search.containing(query_lower)
 
     if len(matches) == 1:
-        return matches[0][1]
+        return tracks[matches[0]]
     elif len(matches) > 1:
-        options = "\n".join([f"  - {k}" for k, v in matches])
-        return f"Multiple matches:\n{options}"
+        options = "\n".join([f"  - {k}" for k in matches[:20]])
+        more = f"\n  ... and {len(matches) - 20} more" if len(matches) > 20 else ""
+        return f"Multiple matches:\n{options}{more}"
     else:
+        similar = search.similar(query_lower)
+        if similar:
+            return f"Not found. Did you mean: {', '.join(similar)}?"
         available = ", ".join(list(tracks.keys())[:10])
         return f"Not found. Available: {available}..."
 
 
-@mcp.tool()
+@tool(QUICK)
 def dj_save(name: str, uri: str) -> str:
     """
     Save a track to your personal library for quick access later.
@@ -418,13 +569,11 @@ def dj_save(name: str, uri: str) -> str:
 
     Example: dj_save("chill vibes", "spotify:track:xxx")
     """
-    tracks = load_tracks()
-    tracks[name.lower()] = uri
-    save_tracks(tracks)
+    library.save(name.lower(), uri)
     return f"Saved '{name}' -> {uri}"
 
 
-@mcp.tool()
+@tool(QUICK)
 def dj_library() -> str:
     """List all tracks in your personal library."""
     tracks = load_tracks()
@@ -435,55 +584,12 @@ def dj_library() -> str:
     return f"Your library ({len(tracks)} tracks):\n" + "\n".join(lines)
 
 
-def parse_lrc_time(lrc_time: str) -> float:
-    """Convert LRC timestamp [mm:ss.xx] to seconds."""
-    # Remove brackets
-    lrc_time = lrc_time.strip("[]")
-    parts = lrc_time.split(":")
-    minutes = int(parts[0])
-    seconds = float(parts[1])
-    return minutes * 60 + seconds
-
+def lrc_stamp(seconds: float) -> str:
+    """[m:ss.xx], as dj_lyrics shows lines."""
+    return f"[{int(seconds // 60)}:{seconds % 60:05.2f}]"
 
-def fetch_lyrics(artist: str, track: str) -> list:
-    """Fetch synced lyrics from LRCLIB (free, no auth)."""
-    try:
-        query = urllib.parse.urlencode({
-            "artist_name": artist,
-            "track_name": track
-        })
-        url = f"https://lrclib.net/api/get?{query}"
 
-        req = urllib.request.Request(url, headers={
-            'User-Agent': 'claude-dj/1.0'
-        })
-
-        with urllib.request.urlopen(req, timeout=10) as response:
-            data = json.loads(response.read().decode('utf-8'))
-
-        synced = data.get("syncedLyrics", "")
-        if not synced:
-            return []
-
-        lines = []
-        for line in synced.split("\n"):
-            line = line.strip()
-            if not line:
-                continue
-            # Parse [mm:ss.xx] lyrics text
-            match = re.match(r'\[(\d+:\d+\.\d+)\]\s*(.*)', line)
-            if match:
-                timestamp = parse_lrc_time(match.group(1))
-                text = match.group(2).strip()
-                if text:  # Only include lines with actual lyrics
-                    lines.append({"time": timestamp, "text": text})
-
-        return lines
-    except Exception as e:
-        return []
-
-
-@mcp.tool()
+@tool(SLOW)
 def dj_lyrics(artist: str, track: str) -> str:
     """
     Get synced lyrics for a track (timestamps + text).
@@ -496,20 +602,16 @@ def dj_lyrics(artist: str, track: str) -> str:
 
     Returns timestamped lyrics you can use with dj_speak.
     """
-    lines = fetch_lyrics(artist, track)
+    lines = fetch_synced_lyrics(artist, track)
     if not lines:
         return f"No synced lyrics found for {artist} - {track}"
 
-    result = []
-    for line in lines:
-        mins = int(line["time"] // 60)
-        secs = line["time"] % 60
-        result.append(f"[{mins}:{secs:05.2f}] {line['text']}")
+    result = [f"{lrc_stamp(t)} {text}" for t, text, _ in lines]
 
     return "\n".join(result)
 
 
-@mcp.tool()
+@tool(SLOW)
 def dj_speak(uri: str, artist: str, track: str, line_number: int, duration: float = 3.0) -> str:
     """
     Play a specific lyric line from a song - for musical speech!
@@ -524,108 +626,296 @@ def dj_speak(uri: str, artist: str, track: str, line_number: int, duration: floa
     Example: Play line 1 of M83 Outro
         dj_speak("spotify:track:xxx", "M83", "Outro", 1, 4.0)
     """
-    lines = fetch_lyrics(artist, track)
+    lines = fetch_synced_lyrics(artist, track)
     if not lines:
         return f"No lyrics found for {artist} - {track}"
 
     if line_number < 1 or line_number > len(lines):
         return f"Line {line_number} doesn't exist. Track has {len(lines)} lines."
 
-    line = lines[line_number - 1]
-    start_time = line["time"]
+    start_time = lines[line_number - 1][0]
 
     # Play the snippet
     return dj_snippet(uri, start_time, duration)
 
 
-@mcp.tool()
+# ============ KARAOKE ============
+
+# Lyrics of the track that's playing, kept until the track changes, so
+# following along costs one lyrics lookup per track rather than per line
+_playing_lyrics = None  # ((artist, title), TimedLyrics or None)
+_playing_lock = threading.Lock()
+
+
+def playing_lyrics(state):
+    """TimedLyrics for the track in `state`, or None if it has none."""
+    global _playing_lyrics
+    key = (state.artist, state.title)
+    with _playing_lock:
+        if _playing_lyrics is None or _playing_lyrics[0] != key:
+            lines = fetch_synced_lyrics(*key) if state.artist and state.title else []
+            _playing_lyrics = (key, TimedLyrics(lines) if lines else None)
+        return _playing_lyrics[1]
+
+
+# Longest the follower sleeps without a player signal (it re-checks then)
+FOLLOW_MAX_WAIT = 5.0
+# Position drift that counts as a seek
+FOLLOW_SEEK_TOLERANCE = 1.0
+
+
+class LyricFollower:
+    """
+    Karaoke mode: a thread that notes every lyric line of the playing
+    track as it starts.
+
+    It sleeps until the next line is due and wakes early on player signals
+    (seek, pause, track change), so it reads the cached player state and
+    a bisect per line instead of polling Spotify or LRCLIB.
+    """
+
+    def __init__(self, history: int = 200):
+        self.changes = deque(maxlen=history)  # (track label, line index, TimedLyrics)
+        self.reported = 0  # changes handed out by take_new()
+        self.total = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._generation % 2 == 1
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._generation += 1
+            self.changes.clear()
+            self.reported = self.total = 0
+            threading.Thread(target=self._run, args=(self._generation,), daemon=True,
+                             name="dj-follow").start()
+
+    def stop(self):
+        with self._lock:
+            if self.running:
+                self._generation += 1
+
+    def take_new(self) -> list:
+        """Line changes since the last call: [(track label, line index, TimedLyrics)]."""
+        with self._lock:
+            new = list(self.changes)[max(len(self.changes) - (self.total - self.reported), 0):]
+            self.reported = self.total
+        return new
+
+    def _note(self, label: str, index: int, timed: TimedLyrics):
+        with self._lock:
+            self.changes.append((label, index, timed))
+            self.total += 1
+
+    def _run(self, generation: int):
+        current = None
+        while self._generation == generation:
+            state = get_player_state()
+            timed = playing_lyrics(state) if state is not None and state.metadata else None
+            wait = FOLLOW_MAX_WAIT
+            if timed is not None:
+                position = state.position_sec
+                index = timed.index_at(position)
+                if index >= 0 and (state.trackid, index) != current:
+                    current = (state.trackid, index)
+                    self._note(f"{state.artist} - {state.title}", index, timed)
+                upcoming = timed.next_time(position)
+                if state.status == "Playing" and upcoming is not None:
+                    wait = min(wait, (upcoming - position) / (state.rate or 1.0) + 0.01)
+            self._wait(state, wait)
+
+    def _wait(self, state, timeout: float):
+        """Sleep up to timeout, or until the player does something unexpected."""
+        if state is None:
+            time.sleep(timeout)
+            return
+        t0 = time.monotonic()
+        playing = state.status == "Playing"
+
+        def changed(now):
+            expected = state.position_sec
+            if playing:
+                expected += (time.monotonic() - t0) * (state.rate or 1.0)
+            return (now.trackid != state.trackid or now.status != state.status
+                    or abs(now.position_sec - expected) > FOLLOW_SEEK_TOLERANCE)
+        try:
+            get_player_cache().wait_for(changed, timeout, poll_interval=0.5)
+        except MprisError:
+            time.sleep(timeout)
+
+
+follower = LyricFollower()
+
+
+def describe_line(timed: TimedLyrics, index: int) -> str:
+    t, text, _ = timed.lines[index]
+    return f"{lrc_stamp(t)} {text} (line {index + 1} of {len(timed)})"
+
+
+@tool(SLOW)
+def dj_current_line() -> str:
+    """
+    What's being sung right now: the lyric line at the current playback
+    position, and the next one. While dj_follow is on, also lists the
+    lines sung since the last check.
+    """
+    state = get_player_state()
+    if state is None or not state.metadata:
+        return "Spotify is not running or no track loaded"
+    timed = playing_lyrics(state)
+    if timed is None:
+        return f"No synced lyrics for {state.artist} - {state.title}"
+
+    out = []
+    if follower.running:
+        new = follower.take_new()
+        if new:
+            out.append("Sung since last check:")
+            out += [f"  {label}: {describe_line(lyrics, i)}" for label, i, lyrics in new]
+
+    position = state.position_sec
+    index = timed.index_at(position)
+    if index < 0:
+        out.append(f"{state.artist} - {state.title} @ {position:.1f}s: before the first line")
+    else:
+        out.append(f"{state.artist} - {state.title} @ {position:.1f}s: {describe_line(timed, index)}")
+    if index + 1 < len(timed):
+        upcoming = timed.times[index + 1]
+        out.append(f"Next in {upcoming - position:.1f}s: {describe_line(timed, index + 1)}")
+    return "\n".join(out)
+
+
+@tool(SLOW)
+def dj_follow(on: bool = True) -> str:
+    """
+    Karaoke mode: follow the lyrics of whatever is playing, line by line.
+
+    While it's on, each line is noted as it starts (following seeks, pauses
+    and track changes); dj_current_line reports the lines sung since it was
+    last called.
+
+    Args:
+        on: True to start following, False to stop
+    """
+    if not on:
+        follower.stop()
+        return "Stopped following lyrics"
+    follower.start()
+    return "Following lyrics\n" + dj_current_line()
+
+
+# DuckDuckGo limit for dj_search_many; a lone dj_search never waits
+ratelimit.set_rate(SEARCH_HOST, 2.0, 4)
+# dj_search_many caps
+SEARCH_WORKERS = 4
+MAX_SEARCH_QUERIES = 50
+
+
+def search_uri(query: str) -> str:
+    """URI, or the message dj_search shows when there isn't one."""
+    try:
+        uri = get_uri_cache().resolve(query)
+    except OSError as e:
+        # An expired answer beats none
+        uri = get_uri_cache().peek(query)
+        if uri is None:
+            return f"Search failed: {e}"
+    return uri or f"No Spotify track found for '{query}'"
+
+
+@tool(SLOW)
 def dj_search(query: str) -> str:
     """
     Search for a track online and return Spotify URI.
 
     Uses DuckDuckGo to find the Spotify link, then converts to URI.
-    Slower than dj_find but works for any track.
+    Slower than dj_find but works for any track. Results are cached
+    (shared with the word-index build), so repeat searches are instant.
 
     Args:
         query: Search term (e.g., "M83 Outro", "Daft Punk Digital Love")
     """
-    try:
-        # Search DuckDuckGo HTML (no JS needed)
-        search_query = urllib.parse.quote(f"{query} spotify track")
-        url = f"https://html.duckduckgo.com/html/?q={search_query}"
-
-        req = urllib.request.Request(url, headers={
-            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36'
-        })
+    return search_uri(query)
 
-        with urllib.request.urlopen(req, timeout=10) as response:
-            html = response.read().decode('utf-8')
 
-        # Find Spotify track URLs
-        pattern = r'open\.spotify\.com/track/([a-zA-Z0-9]+)'
-        matches = re.findall(pattern, html)
+@tool(SLOW)
+def dj_search_many(queries: list) -> str:
+    """
+    Search for several tracks at once. Runs the searches concurrently
+    (rate-limited), skipping the ones already cached.
 
-        if matches:
-            track_id = matches[0]
-            uri = f"spotify:track:{track_id}"
-            return uri
-        else:
-            return f"No Spotify track found for '{query}'"
+    Args:
+        queries: Search terms, e.g. ["M83 Outro", "Daft Punk Digital Love"]
 
-    except Exception as e:
-        return f"Search failed: {e}"
+    Returns one "query -> URI" line per query, in order.
+    """
+    queries = [str(q) for q in queries][:MAX_SEARCH_QUERIES]
+    if not queries:
+        return "No queries given"
+    with ThreadPoolExecutor(min(SEARCH_WORKERS, len(queries))) as pool:
+        results = list(pool.map(search_uri, queries))
+    return "\n".join(f"{query} -> {result}" for query, result in zip(queries, results))
 
 
 # ============ MUSICAL SPEECH ============
 
-@mcp.tool()
-def dj_say(word: str, variant: int = 0) -> str:
+@tool(SLOW)
+def dj_say(word: str, variant: Optional[int] = None) -> str:
     """
     Say a word through music! Looks up the word in the indexed song lyrics
     and plays that moment from the song.
 
-    The word index was auto-built from ~50 iconic songs. Some entries are
-    better than others - pick variants to find the best one.
+    Variants are ranked by how cleanly the word can be heard (pauses around
+    it, short line, sung in the chorus), so by default the best one plays
+    and there's no need to look through dj_word_info first.
 
     Args:
         word: The word to say (e.g., "love", "hello", "champion")
-        variant: Which entry to use if multiple exist (0 = first, 1 = second, etc.)
+        variant: Which entry to use instead of the best (0 = best, 1 = second best, etc.)
 
     Example:
-        dj_say("love")  # Plays "Love, love, love" from The Beatles
-        dj_say("hello", 1)  # Uses 2nd entry for "hello"
+        dj_say("love")  # Plays the best-ranked "love"
+        dj_say("hello", 1)  # Uses the 2nd best entry for "hello"
     """
     words = load_words()
     word_lower = word.lower().strip()
 
     if word_lower not in words:
-        # Try fuzzy match
-        matches = [w for w in words.keys() if word_lower in w]
+        # Prefix, substring and typo matches from the prebuilt search index
+        matches = word_index.suggest(word_lower, 5)
         if matches:
-            suggestions = ", ".join(matches[:5])
+            suggestions = ", ".join(matches)
             return f"'{word}' not found. Similar: {suggestions}"
         return f"'{word}' not found in word index. Try common words like: love, hello, world, you, me, want, need, feel, believe"
 
-    entries = words[word_lower]
-    if variant >= len(entries):
+    entries = scored_entries(word_lower, words)
+    pick = variant or 0
+    if pick >= len(entries):
         return f"'{word}' only has {len(entries)} variants (0-{len(entries)-1})"
 
-    entry = entries[variant]
+    entry = entries[pick]
 
     # Play the snippet
     result = dj_snippet(entry["uri"], entry["time"], entry.get("duration", 1.5))
 
-    return f"Saying '{word}' via {entry['artist']} - {entry['track']}: \"{entry['line']}\" ({len(entries)} variants available)"
+    which = "best of" if variant is None else f"variant {pick} of"
+    return f"Saying '{word}' via {entry['artist']} - {entry['track']}: \"{entry['line']}\" ({which} {len(entries)} variants, score {entry['score']:.2f})"
 
 
-@mcp.tool()
-def dj_word_info(word: str) -> str:
+@tool(QUICK)
+def dj_word_info(word: str, limit: int = 10) -> str:
     """
-    Show all available entries for a word. Use this to find the best
-    variant before calling dj_say.
+    Show the entries for a word, best first, with their scores. dj_say
+    already plays the best one; use this to pick a different variant.
 
     Args:
         word: The word to look up
+        limit: How many entries to list
     """
     words = load_words()
     word_lower = word.lower().strip()
@@ -633,16 +923,466 @@ def dj_word_info(word: str) -> str:
     if word_lower not in words:
         return f"'{word}' not found in word index"
 
-    entries = words[word_lower]
-    lines = [f"'{word}' has {len(entries)} variants:"]
-    for i, entry in enumerate(entries[:10]):  # Show first 10
-        lines.append(f"  [{i}] {entry['artist']} - {entry['track']}: \"{entry['line'][:50]}...\" @ {entry['time']:.1f}s")
+    entries = scored_entries(word_lower, words)
+    lines = [f"'{word}' has {len(entries)} variants, best first:"]
+    for i, entry in enumerate(entries[:limit]):
+        lines.append(f"  [{i}] {entry['score']:.2f} {entry['artist']} - {entry['track']}: \"{entry['line'][:50]}...\" @ {entry['time']:.2f}s for {entry.get('duration', 1.5):.1f}s")
+
+    if len(entries) > limit:
+        lines.append(f"  ... and {len(entries) - limit} more")
+
+    return "\n".join(lines)
+
+
+# ============ SEQUENCER ============
+
+# How early to start preparing a clip so it's audible on schedule. Learned
+# from how long loads/seeks actually take (exponential moving average).
+lead_times = {"load": 0.15, "seek": 0.03}
+
+
+def resolve_clip(clip, words: dict):
+    """
+    Turn one dj_sequence clip into {"uri", "start", "duration", "label"}.
+
+    Returns an error string if the clip can't be resolved.
+    """
+    if isinstance(clip, str):
+        clip = {"word": clip}
+    if isinstance(clip, (list, tuple)) and len(clip) == 3:
+        clip = {"uri": clip[0], "start": clip[1], "duration": clip[2]}
+    if not isinstance(clip, dict):
+        return f"Don't know how to play {clip!r}"
+
+    if "word" in clip:
+        word = str(clip["word"]).lower().strip()
+        variant = int(clip.get("variant", 0))
+        if word not in words:
+            return f"'{word}' not found in word index"
+        entries = scored_entries(word, words)
+        if variant >= len(entries):
+            return f"'{word}' only has {len(entries)} variants (0-{len(entries)-1})"
+        entry = entries[variant]
+        return {
+            "uri": entry["uri"],
+            "start": entry["time"],
+            "duration": float(clip.get("duration", entry.get("duration", 1.5))),
+            "label": f"{word} ({entry['artist']} - {entry['track']})",
+        }
+
+    try:
+        uri = clip["uri"]
+        start = float(clip.get("start", clip.get("start_sec", 0)))
+        duration = float(clip.get("duration", clip.get("duration_sec", 3.0)))
+    except (KeyError, TypeError, ValueError):
+        return f"Clip needs uri/start/duration: {clip!r}"
+    return {"uri": uri, "start": start, "duration": duration,
+            "label": clip.get("label", f"{uri} @ {start:.1f}s")}
+
+
+def play_sequence(clips: list):
+    """
+    Play resolved clips back-to-back. Returns (per-clip timing reports,
+    whether it played to the end).
+
+    Every clip start is a scheduler event (PLAYBACK group), fired early by
+    the learned lead time so the audio lands on its planned slot. A clip on
+    the same track as the previous one only needs a seek, not a load. The
+    closing pause is scheduled once the last clip has actually started, so
+    a late load doesn't cut it short. If the sequence is cancelled
+    (dj_pause, another snippet) it stops there and this returns.
+    """
+    report = []
+    done = threading.Event()
+    finished = []
+    generation = playback_generation
+    now = time.monotonic()
+    planned = now + lead_times["load"]
+    previous_uri = None
+
+    def finish():
+        dbus_call("Pause")
+        finished.append(True)
+        done.set()
+
+    def start_clip(clip, planned_at, same_track, last):
+        t0 = time.monotonic()
+        state = get_player_state() if same_track else None
+        if state and state.uri == clip["uri"]:
+            kind = "seek"
+            wait_for_seek(clip["start"], state.trackid)
+        else:
+            # prepare_track only seeks if the track turns out to be loaded already
+            timings = prepare_track(clip["uri"], clip["start"])
+            kind = "load" if "load" in timings else "seek"
+        with _playback_lock:
+            if playback_generation != generation:
+                # Cancelled while this clip was loading, and with it the
+                # pause that would have stopped it
+                dbus_call("Pause")
+                done.set()
+                return
+            dbus_call("Play")
+            started = time.monotonic()
+            if last:
+                scheduler.at(started + clip["duration"], finish, "pause (end of sequence)",
+                             PLAYBACK, on_cancel=done.set)
+        lead_times[kind] = 0.7 * lead_times[kind] + 0.3 * (started - t0)
+        report.append({"label": clip["label"], "kind": kind,
+                       "prep": started - t0, "drift": started - planned_at})
+
+    for i, clip in enumerate(clips):
+        same_track = clip["uri"] == previous_uri
+        lead = lead_times["seek" if same_track else "load"]
+        scheduler.at(planned - lead,
+                     lambda c=clip, p=planned, s=same_track, last=i == len(clips) - 1:
+                         start_clip(c, p, s, last),
+                     f"clip {i + 1}: {clip['label']}", PLAYBACK, on_cancel=done.set)
+        planned += clip["duration"]
+        previous_uri = clip["uri"]
+
+    done.wait(planned - time.monotonic() + READY_TIMEOUT * len(clips))
+    return report, bool(finished)
+
+
+@tool(SLOW)
+def dj_sequence(clips: list) -> str:
+    """
+    Play several clips back-to-back on a precise schedule - a whole musical
+    sentence in one call instead of one dj_say/dj_speak per word.
+
+    Args:
+        clips: List of clips, each one of:
+            - a word from the index: "hello" or {"word": "hello", "variant": 1}
+            - a snippet: {"uri": "spotify:track:xxx", "start": 12.5, "duration": 2}
+
+    Example: "Hello... World!"
+        dj_sequence(["hello", {"word": "world", "variant": 3}])
+
+    Returns how far each clip's actual start drifted from its planned slot.
+    """
+    if not clips:
+        return "Nothing to play"
+    words = load_words() if any(isinstance(c, str) or (isinstance(c, dict) and "word" in c)
+                                for c in clips) else {}
+    resolved = []
+    for clip in clips:
+        result = resolve_clip(clip, words)
+        if isinstance(result, str):
+            return result
+        resolved.append(result)
+
+    cancel_pending()
+    report, finished = play_sequence(resolved)
+
+    lines = [f"Played {len(report)}/{len(resolved)} clips" +
+             ("" if finished else " (cancelled)") + ":"]
+    for i, r in enumerate(report):
+        lines.append(f"  [{i + 1}] {r['label']}: {r['kind']} {r['prep']:.2f}s, "
+                     f"drift {r['drift'] * 1000:+.0f}ms")
+    if report:
+        worst = max(abs(r["drift"]) for r in report)
+        lines.append(f"Worst drift: {worst * 1000:.0f}ms")
+    return "\n".join(lines)
+
+
+def line_start(entry: dict) -> float:
+    """When the entry's lyric line starts (entries point at the word itself)."""
+    return round(entry["time"] - entry.get("offset", 0), 2)
+
+
+def sung_after(prev_word: str, prev: dict, word: str, entry: dict) -> bool:
+    """
+    Whether `word` (entry) is sung after `prev_word` (prev) on the same
+    lyric line. Entries with word offsets go by when the word is sung, so
+    each occurrence of a repeated word counts where it is; indexes built
+    without them fall back to the words' first positions in the line.
+    """
+    if "offset" in prev and "offset" in entry:
+        return entry["time"] > prev["time"]
+    line_words = extract_words(entry["line"])
+    return (word in line_words and prev_word in line_words
+            and line_words.index(prev_word) < line_words.index(word))
+
+
+# Costs for plan_phrase: loading another track is what makes a sentence
+# sound choppy, a seek within the same track is cheap, and the next word
+# on the same lyric line is free (it's already playing).
+SWITCH_TRACK_COST = 1.0
+SAME_TRACK_COST = 0.3
+SAME_LINE_COST = 0.0
+# Extra playtime for each additional word merged into one line clip, for
+# indexes built before word-level timings (entries without "offset")
+MERGED_WORD_SEC = 0.4
+
+
+def plan_phrase(tokens: list, words: dict) -> list:
+    """
+    Pick one index entry per token so the phrase needs as few track
+    switches as possible (Viterbi over the variants).
+
+    Consecutive words from the same track are preferred, and the same lyric
+    line is preferred most when the words appear in that order in the
+    line. Better-ranked variants win ties. Returns [(word, variant, entry)].
+    """
+    if not tokens:
+        return []
+    # Decode each word's entries once (the compact index builds them on demand)
+    words = {t: scored_entries(t, words) for t in set(tokens)}
+
+    # steps[i][v] = (cost, back pointer into steps[i-1])
+    steps = []
+    prev = None
+    for word in tokens:
+        entries = words[word]
+        step = []
+        if prev is None:
+            step = [(v * 1e-6, None) for v in range(len(entries))]
+        else:
+            prev_word, prev_entries, prev_step = prev
+            best_all = min(range(len(prev_step)), key=lambda v: prev_step[v][0])
+            best_uri, on_line = {}, {}
+            for v, (cost, _) in enumerate(prev_step):
+                e = prev_entries[v]
+                if e["uri"] not in best_uri or cost < prev_step[best_uri[e["uri"]]][0]:
+                    best_uri[e["uri"]] = v
+                on_line.setdefault((e["uri"], line_start(e)), []).append(v)
+            for v, e in enumerate(entries):
+                options = [(prev_step[best_all][0] + SWITCH_TRACK_COST, best_all)]
+                if e["uri"] in best_uri:
+                    u = best_uri[e["uri"]]
+                    options.append((prev_step[u][0] + SAME_TRACK_COST, u))
+                # Any earlier word on this line can run on into this one, not
+                # just the cheapest (a repeated word may be sung before and after)
+                same = [u for u in on_line.get((e["uri"], line_start(e)), ())
+                        if sung_after(prev_word, prev_entries[u], word, e)]
+                if same:
+                    u = min(same, key=lambda u: prev_step[u][0])
+                    options.append((prev_step[u][0] + SAME_LINE_COST, u))
+                cost, back = min(options)
+                step.append((cost + v * 1e-6, back))
+        steps.append(step)
+        prev = (word, entries, step)
+
+    # Walk the back pointers from the cheapest final variant
+    v = min(range(len(steps[-1])), key=lambda i: steps[-1][i][0])
+    plan = []
+    for i in range(len(tokens) - 1, -1, -1):
+        plan.append((tokens[i], v, words[tokens[i]][v]))
+        v = steps[i][v][1]
+    plan.reverse()
+    return plan
+
+
+def phrase_clips(plan: list) -> list:
+    """Turn a plan into sequencer clips, merging runs on the same line."""
+    clips = []
+    prev = None
+    for word, variant, entry in plan:
+        last = clips[-1] if clips else None
+        # Same test plan_phrase priced the step with, so a run it planned
+        # as one line is played as one clip
+        merge = last and last["uri"] == entry["uri"] and last["line_start"] == line_start(entry) \
+            and sung_after(*prev, word, entry)
+        prev = (word, entry)
+        if merge:
+            if "offset" in entry:
+                # Word-level timings: play through to the end of this word
+                last["duration"] = round(max(last["duration"],
+                                             entry["time"] + entry["duration"] - last["start"]), 2)
+            else:
+                last["duration"] += MERGED_WORD_SEC
+            last["label"] = f"{last['label'].split(' (')[0]} {word} ({entry['artist']} - {entry['track']})"
+            continue
+        clips.append({
+            "uri": entry["uri"],
+            "start": entry["time"],
+            "duration": entry.get("duration", 1.5),
+            "label": f"{word} ({entry['artist']} - {entry['track']})",
+            "line_start": line_start(entry),
+        })
+    return clips
+
+
+@tool(SLOW)
+def dj_say_phrase(phrase: str) -> str:
+    """
+    Say a whole sentence through music in one call.
+
+    Splits the phrase into words the same way the word index was built,
+    looks them all up at once, picks variants that keep track switches to
+    a minimum (same song, ideally the same lyric line) and plays them as
+    one scheduled sequence.
+
+    Args:
+        phrase: What to say (e.g., "we will survive tonight")
+
+    Words shorter than 2 letters aren't in the index and are skipped.
+    """
+    words = load_words()
+    tokens = extract_words(phrase)
+    skipped = [t for t in tokens if len(t) < 2]
+    tokens = [t for t in tokens if len(t) >= 2]
+    missing = [t for t in tokens if t not in words]
+    if missing:
+        return f"Not in word index: {', '.join(missing)}. Nothing played."
+    if not tokens:
+        return "Nothing to say"
+
+    plan = plan_phrase(tokens, words)
+    clips = phrase_clips(plan)
+
+    cancel_pending()
+    report, finished = play_sequence(clips)
+
+    switches = len({c["uri"] for c in clips})
+    lines = [f"Said '{' '.join(tokens)}' in {len(clips)} clips from {switches} tracks:"]
+    if not finished:
+        lines[0] = f"Cancelled after {len(report)}/{len(clips)} clips of '{' '.join(tokens)}':"
+    for word, variant, entry in plan:
+        lines.append(f"  {word} [{variant}]: {entry['artist']} - {entry['track']}: \"{entry['line']}\"")
+    if report:
+        worst = max(abs(r["drift"]) for r in report)
+        lines.append(f"Worst drift: {worst * 1000:.0f}ms")
+    if skipped:
+        lines.append(f"Skipped: {', '.join(skipped)}")
+    return "\n".join(lines)
+
+
+# ============ PREFETCH ============
 
-    if len(entries) > 10:
-        lines.append(f"  ... and {len(entries) - 10} more")
+# CLAUDE_DJ_WARMUP=1 loads the indexes and the library's lyrics in the
+# background when the server starts, so the first dj_say/dj_speak doesn't
+# pay for them
+WARMUP = os.environ.get("CLAUDE_DJ_WARMUP", "") not in ("", "0")
+# Most library songs whose lyrics the warm-up fetches
+WARMUP_MAX_SONGS = 200
+MAX_PREPARE_ITEMS = 50
+warmup = {"state": "off"}
 
+
+def song_names(item: str, uri: str = None):
+    """(artist, track) for a URI the word index knows or an "Artist - Track" name."""
+    names = word_index.tracks().get(uri or item)
+    if names is None and " - " in item:
+        artist, track = item.split(" - ", 1)
+        names = (artist.strip(), track.strip())
+    return names
+
+
+def prefetch_lyrics(names):
+    """Lyrics for (artist, track) into the cache: the lines, or None if LRCLIB can't be reached."""
+    try:
+        return get_synced_lyrics(*names)
+    except LyricsUnavailable:
+        return None
+
+
+def prefetch_song(item: str) -> str:
+    """
+    Resolve a URI, "Artist - Track" or search query and fetch its lyrics
+    into the cache. Returns a line for dj_prepare's report.
+    """
+    names = None
+    if item.startswith("spotify:"):
+        uri = item
+    else:
+        names = song_names(item)
+        # Songs in the library (saved lowercased) or the index need no search
+        uri = load_tracks().get(item.lower())
+        if uri is None and names:
+            uri = next((u for u, n in word_index.tracks().items() if n == names), None)
+        if uri is None:
+            uri = search_uri(song_query(*names) if names else item)
+        if not uri.startswith("spotify:"):
+            if names is None:
+                return f"{item}: {uri}"
+            uri = None
+    names = song_names(item, uri) or names
+    if names is None:
+        return f"{item} -> {uri}"
+    lines = prefetch_lyrics(names)
+    if lines is None:
+        found = "lyrics lookup failed, try again later"
+    else:
+        found = f"{len(lines)} lyric lines" if lines else "no synced lyrics"
+    return f"{item} -> {uri or 'no URI'} ({names[0]} - {names[1]}, {found})"
+
+
+def warm_up():
+    """Open the player connection, load the indexes and prefetch library lyrics."""
+    t0 = time.monotonic()
+    warmup["state"] = "running"
+    try:
+        get_player_state()
+        word_index.data()
+        known = word_index.tracks()
+        library.search()
+        songs = []
+        for name, uri in library.data().items():
+            names = known.get(uri) or song_names(name)
+            if names and names not in songs:
+                songs.append(names)
+        songs = songs[:WARMUP_MAX_SONGS]
+        with ThreadPoolExecutor(SEARCH_WORKERS, thread_name_prefix="warmup") as pool:
+            results = list(pool.map(prefetch_lyrics, songs))
+    except Exception as e:
+        # Nothing depends on the warm-up; the tools load what they need anyway
+        warmup["state"] = f"failed ({e})"
+        return
+    warmup.update(state="done", seconds=time.monotonic() - t0, songs=len(songs),
+                  lyrics=sum(1 for lines in results if lines),
+                  failed=sum(1 for lines in results if lines is None))
+
+
+def start_warm_up() -> threading.Thread:
+    thread = threading.Thread(target=warm_up, daemon=True, name="warmup")
+    thread.start()
+    return thread
+
+
+@tool(SLOW)
+def dj_prepare(words: Optional[list] = None, uris: Optional[list] = None) -> str:
+    """
+    Get upcoming clips ready ahead of time, so the call that plays them
+    only has to send the playback commands.
+
+    Call this while you're still deciding, e.g. before a dj_say_phrase or
+    a run of dj_speak calls.
+
+    Args:
+        words: Words or phrases you're about to say; their variants are
+            looked up and ranked now
+        uris: Songs you're about to play: Spotify URIs, "Artist - Track"
+            names or search queries. Queries are resolved to URIs and the
+            lyric timings are fetched.
+    """
+    words = [str(w) for w in words or []][:MAX_PREPARE_ITEMS]
+    uris = [str(u) for u in uris or []][:MAX_PREPARE_ITEMS]
+    if not words and not uris:
+        return "Nothing to prepare"
+
+    t0 = time.monotonic()
+    # Connects to Spotify and subscribes to its signals if nothing has yet
+    get_player_state()
+    lines = []
+    if words:
+        index = load_words()
+        tokens = list(dict.fromkeys(t for w in words for t in extract_words(w) if len(t) >= 2))
+        ready = [t for t in tokens if t in index]
+        for token in ready:
+            scored_entries(token, index)
+        missing = [t for t in tokens if t not in index]
+        lines.append(f"Words: {len(ready)} ready" +
+                     (f", not in word index: {', '.join(missing)}" if missing else ""))
+    if uris:
+        with ThreadPoolExecutor(min(SEARCH_WORKERS, len(uris))) as pool:
+            lines += list(pool.map(prefetch_song, uris))
+    lines.append(f"Prepared in {time.monotonic() - t0:.2f}s")
     return "\n".join(lines)
 
 
 if __name__ == "__main__":
+    if WARMUP:
+        start_warm_up()
     mcp.run()
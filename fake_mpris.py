@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Fake Spotify for testing and benchmarking claude-dj without the real thing.
+
+Owns org.mpris.MediaPlayer2.spotify on the session bus and answers the MPRIS
+Player calls the DJ uses. OpenUri "loads" the track after --load-delay
+seconds, position advances with the clock while playing, and it emits
+PropertiesChanged / Seeked like Spotify does.
+
+    python3 fake_mpris.py --private        # spins up its own bus, prints the address
+    DBUS_SESSION_BUS_ADDRESS=... python3 dj_mcp.py
+"""
+
+import argparse
+import os
+import subprocess
+import threading
+import time
+
+from mpris import (
+    MPRIS_PATH, PLAYER_IFACE, PROPS_IFACE, SPOTIFY_DEST,
+    BUS_NAME, BUS_PATH, Connection, MprisError,
+)
+
+TRACK_LENGTH_US = 240_000_000
+
+
+def start_private_bus():
+    """Start a throwaway dbus-daemon. Returns (process, address)."""
+    proc = subprocess.Popen(
+        ["dbus-daemon", "--session", "--nofork", "--print-address"],
+        stdout=subprocess.PIPE, text=True,
+    )
+    address = proc.stdout.readline().strip()
+    if not address:
+        proc.kill()
+        raise MprisError("dbus-daemon didn't print an address")
+    return proc, address
+
+
+def track_id(uri: str) -> str:
+    """spotify:track:XYZ -> XYZ"""
+    return uri.rsplit(":", 1)[-1]
+
+
+class FakePlayer:
+    """An MPRIS player living on a Connection."""
+
+    def __init__(self, conn: Connection, load_delay: float = 0.0):
+        self.conn = conn
+        self.load_delay = load_delay
+        self.status = "Stopped"
+        self.metadata = {}
+        self.volume = 1.0
+        self.rate = 1.0
+        self.calls = 0
+        self._position_us = 0
+        self._since = time.monotonic()
+        self._lock = threading.RLock()
+        self._load_timer = None
+        conn.on_method_call = self.handle
+
+    def start(self):
+        """Claim the Spotify bus name."""
+        # flags 0x4 = DBUS_NAME_FLAG_DO_NOT_QUEUE; reply 1 = primary owner
+        result = self.conn.call(BUS_NAME, BUS_PATH, BUS_NAME, "RequestName",
+                                "su", (SPOTIFY_DEST, 0x4))[0]
+        if result != 1:
+            raise MprisError(f"{SPOTIFY_DEST} is already taken")
+        return self
+
+    # ---- state ----
+
+    def position_us(self) -> int:
+        with self._lock:
+            pos = self._position_us
+            if self.status == "Playing":
+                pos += int((time.monotonic() - self._since) * 1_000_000 * self.rate)
+            return min(pos, TRACK_LENGTH_US) if self.metadata else 0
+
+    def _set_position(self, us: int):
+        self._position_us = max(0, us)
+        self._since = time.monotonic()
+
+    def _set_status(self, status: str):
+        with self._lock:
+            if status == self.status:
+                return
+            self._set_position(self.position_us())
+            self.status = status
+        self._changed({"PlaybackStatus": ("s", status)})
+
+    def _load(self, uri: str):
+        with self._lock:
+            self.metadata = {
+                "mpris:trackid": ("o", f"/com/spotify/track/{track_id(uri)}"),
+                "mpris:length": ("t", TRACK_LENGTH_US),
+                "xesam:title": ("s", f"Fake Track {track_id(uri)}"),
+                "xesam:artist": ("as", ["Fake Artist"]),
+                "xesam:album": ("s", "Fake Album"),
+                "xesam:url": ("s", f"https://open.spotify.com/track/{track_id(uri)}"),
+            }
+            self._set_position(0)
+            self.status = "Playing"
+        self._changed({"Metadata": ("a{sv}", self.metadata),
+                       "PlaybackStatus": ("s", "Playing")})
+
+    def properties(self) -> dict:
+        with self._lock:
+            return {
+                "PlaybackStatus": ("s", self.status),
+                "Metadata": ("a{sv}", self.metadata),
+                "Position": ("x", self.position_us()),
+                "Volume": ("d", self.volume),
+                "Rate": ("d", self.rate),
+                "MinimumRate": ("d", 1.0),
+                "MaximumRate": ("d", 1.0),
+                "CanPlay": ("b", True),
+                "CanPause": ("b", True),
+                "CanSeek": ("b", True),
+                "CanGoNext": ("b", True),
+                "CanGoPrevious": ("b", True),
+                "CanControl": ("b", True),
+            }
+
+    def _changed(self, props: dict):
+        self.conn.emit(MPRIS_PATH, PROPS_IFACE, "PropertiesChanged", "sa{sv}as",
+                       (PLAYER_IFACE, props, []))
+
+    # ---- D-Bus ----
+
+    def handle(self, msg):
+        self.calls += 1
+        if msg.path != MPRIS_PATH:
+            self.conn.reply_error(msg, "org.freedesktop.DBus.Error.UnknownObject", msg.path or "")
+            return
+        handler = getattr(self, f"_do_{msg.member}", None)
+        if handler is None:
+            self.conn.reply_error(msg, "org.freedesktop.DBus.Error.UnknownMethod", msg.member or "")
+            return
+        result = handler(*msg.body)
+        if result is None:
+            self.conn.reply(msg)
+        else:
+            self.conn.reply(msg, *result)
+
+    def _do_Play(self):
+        if self.metadata:
+            self._set_status("Playing")
+
+    def _do_Pause(self):
+        if self.status == "Playing":
+            self._set_status("Paused")
+
+    def _do_PlayPause(self):
+        self._set_status("Paused" if self.status == "Playing" else "Playing")
+
+    def _do_Stop(self):
+        self._set_status("Stopped")
+
+    def _do_Next(self):
+        self._load(f"spotify:track:next{int(time.monotonic() * 1000)}")
+
+    def _do_Previous(self):
+        with self._lock:
+            self._set_position(0)
+        self.conn.emit(MPRIS_PATH, PLAYER_IFACE, "Seeked", "x", (0,))
+
+    def _do_OpenUri(self, uri):
+        if self._load_timer:
+            self._load_timer.cancel()
+        if self.load_delay > 0:
+            self._load_timer = threading.Timer(self.load_delay, self._load, (uri,))
+            self._load_timer.daemon = True
+            self._load_timer.start()
+        else:
+            self._load(uri)
+
+    def _do_SetPosition(self, trackid, position):
+        with self._lock:
+            current = self.metadata.get("mpris:trackid", ("o", ""))[1]
+            if track_id(trackid.replace("/", ":")) != track_id(current.replace("/", ":")):
+                return  # MPRIS says: ignore stale trackids
+            if position < 0 or position > TRACK_LENGTH_US:
+                return
+            self._set_position(position)
+        self.conn.emit(MPRIS_PATH, PLAYER_IFACE, "Seeked", "x", (position,))
+
+    def _do_Seek(self, offset):
+        with self._lock:
+            self._set_position(self.position_us() + offset)
+            position = self._position_us
+        self.conn.emit(MPRIS_PATH, PLAYER_IFACE, "Seeked", "x", (position,))
+
+    def _do_Get(self, iface, prop):
+        props = self.properties()
+        if iface != PLAYER_IFACE or prop not in props:
+            raise MprisError(f"No such property {iface}.{prop}")
+        return "v", (props[prop],)
+
+    def _do_GetAll(self, iface):
+        return "a{sv}", (self.properties() if iface == PLAYER_IFACE else {},)
+
+    def _do_Set(self, iface, prop, value):
+        if iface == PLAYER_IFACE and prop == "Volume":
+            self.volume = float(value)
+            self._changed({"Volume": ("d", self.volume)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--private", action="store_true",
+                        help="start a private dbus-daemon instead of using the session bus")
+    parser.add_argument("--load-delay", type=float, default=0.1,
+                        help="seconds OpenUri takes to switch tracks (default: 0.1)")
+    args = parser.parse_args()
+
+    bus = None
+    if args.private:
+        bus, address = start_private_bus()
+        os.environ["DBUS_SESSION_BUS_ADDRESS"] = address
+        print(f"DBUS_SESSION_BUS_ADDRESS={address}", flush=True)
+
+    try:
+        FakePlayer(Connection.open(), args.load_delay).start()
+        print(f"Fake Spotify is up as {SPOTIFY_DEST}. Ctrl-C to stop.", flush=True)
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if bus:
+            bus.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+One HTTP client for every web lookup (LRCLIB, DuckDuckGo).
+
+urllib.request.urlopen opens a new connection, TCP and TLS handshake
+included, for every request. HttpClient keeps idle connections per host
+and reuses them (HTTP/1.1 keep-alive), asks for gzip, caps how many
+requests are in flight across all hosts, and times every request.
+Per-host rate limits still come from ratelimit.
+
+    response = get_client().get("https://lrclib.net/api/get?...")
+    response.raise_for_status()
+    data = response.json()
+"""
+
+import gzip
+import http.client
+import json
+import ssl
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass
+
+import ratelimit
+
+USER_AGENT = "claude-dj/1.0"
+
+
+class HttpError(OSError):
+    """A non-2xx answer. An OSError, like urllib's HTTPError, so retries apply."""
+
+    def __init__(self, code: int, url: str):
+        super().__init__(f"HTTP {code} from {url}")
+        self.code = code
+
+
+@dataclass
+class Response:
+    url: str
+    status: int
+    headers: dict
+    body: bytes
+    elapsed: float  # seconds, request sent to body read
+    reused: bool    # went over a kept-alive connection
+
+    def raise_for_status(self):
+        if not 200 <= self.status < 300:
+            raise HttpError(self.status, self.url)
+
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.body)
+
+
+# A kept-alive connection the server dropped fails on first use like this;
+# those requests are retried once on a fresh connection
+_STALE = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+          ConnectionResetError, BrokenPipeError)
+
+
+class HostStats:
+    __slots__ = ("requests", "connects", "reused", "errors", "bytes", "wire_bytes",
+                 "total_time", "max_time")
+
+    def __init__(self):
+        self.requests = self.connects = self.reused = self.errors = 0
+        self.bytes = self.wire_bytes = 0
+        self.total_time = self.max_time = 0.0
+
+
+class HttpClient:
+    """
+    Keep-alive connection pools per (scheme, host, port).
+
+    At most max_connections requests are in flight at once, across hosts;
+    up to max_idle idle connections per host are kept for idle_timeout
+    seconds.
+    """
+
+    def __init__(self, max_connections: int = 16, max_idle: int = 8,
+                 idle_timeout: float = 60.0, timeout: float = 10.0):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._idle = {}   # (scheme, host, port) -> [(connection, idle since)]
+        self._stats = {}  # host -> HostStats
+        self._lock = threading.Lock()
+        self._ssl = None
+
+    def _connect(self, scheme: str, host: str, port: int, timeout: float):
+        if scheme == "https":
+            if self._ssl is None:
+                self._ssl = ssl.create_default_context()
+            return http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl)
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _checkout(self, key: tuple):
+        """An idle connection for key, or None."""
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                conn, since = idle.pop()
+                if now - since <= self.idle_timeout:
+                    return conn
+                conn.close()
+        return None
+
+    def _checkin(self, key: tuple, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def _host_stats(self, host: str) -> HostStats:
+        with self._lock:
+            stats = self._stats.get(host)
+            if stats is None:
+                stats = self._stats[host] = HostStats()
+            return stats
+
+    def get(self, url: str, headers: dict = None, timeout: float = None) -> Response:
+        """
+        GET url (waiting for its host's rate limit and a free slot first).
+
+        Returns the response whatever its status; raises OSError if the
+        server can't be reached.
+        """
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        request_headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip",
+                           "Connection": "keep-alive", **(headers or {})}
+        timeout = self.timeout if timeout is None else timeout
+        stats = self._host_stats(parts.hostname)
+
+        ratelimit.acquire(url)
+        with self._slots:
+            t0 = time.monotonic()
+            try:
+                response, reused = self._send(key, path, request_headers, timeout, stats)
+            except OSError:
+                with self._lock:
+                    stats.errors += 1
+                raise
+            elapsed = time.monotonic() - t0
+        with self._lock:
+            stats.requests += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+        status, response_headers, body = response
+        return Response(url, status, response_headers, body, elapsed, reused)
+
+    def _send(self, key, path, headers, timeout, stats):
+        conn = self._checkout(key)
+        reused = conn is not None
+        while True:
+            if conn is None:
+                conn = self._connect(*key, timeout)
+                with self._lock:
+                    stats.connects += 1
+            elif conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if reused and isinstance(e, _STALE):
+                    conn, reused = None, False  # one more go on a fresh connection
+                    continue
+                if isinstance(e, OSError):
+                    raise
+                raise OSError(f"bad HTTP response: {e}") from e
+            break
+
+        response_headers = {k.lower(): v for k, v in response.getheaders()}
+        with self._lock:
+            stats.reused += reused
+            stats.wire_bytes += len(body)
+        if response_headers.get("content-encoding") == "gzip":
+            try:
+                body = gzip.decompress(body)
+            except (OSError, EOFError) as e:
+                conn.close()
+                raise OSError(f"bad gzip body: {e}") from e
+        with self._lock:
+            stats.bytes += len(body)
+        if response.will_close:
+            conn.close()
+        else:
+            self._checkin(key, conn)
+        return (response.status, response_headers, body), reused
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn, _ in connections:
+                conn.close()
+
+    def stats(self) -> dict:
+        """host -> {requests, connects, reused, errors, bytes, wire_bytes, avg_ms, max_ms}"""
+        with self._lock:
+            return {host: {"requests": s.requests, "connects": s.connects, "reused": s.reused,
+                           "errors": s.errors, "bytes": s.bytes, "wire_bytes": s.wire_bytes,
+                           "avg_ms": s.total_time / s.requests * 1000 if s.requests else 0.0,
+                           "max_ms": s.max_time * 1000}
+                    for host, s in self._stats.items()}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """The process-wide HttpClient."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+    return _client
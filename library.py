@@ -0,0 +1,144 @@
+"""
+The personal track library (tracks.json), kept resident in memory.
+
+Loaded once and only re-read when the file's mtime or size changes (e.g.
+edited by hand). dj_save updates memory straight away and the file is
+written behind: saves within flush_delay of each other go out as one
+atomic write, so saving to a big library doesn't rewrite it per call.
+"""
+
+import atexit
+import json
+import threading
+import time
+from pathlib import Path
+
+from storage import atomic_write
+from suggest import SuggestIndex
+
+
+class TrackLibrary:
+    """name -> Spotify URI, backed by a JSON file."""
+
+    def __init__(self, path: Path, flush_delay: float = 1.0):
+        self.path = Path(path)
+        self.flush_delay = flush_delay
+        self._data = None
+        self._signature = None
+        self._pending = {}  # saved but not written yet
+        self._version = 0   # bumped on every change, keys the search index
+        self._search = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._writer = None
+        self.loads = 0
+        self.saves = 0
+        self.writes = 0
+        self.write_errors = 0
+
+    def _stat(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self, signature):
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            data = {}
+        # Saves that haven't been written yet win over the file
+        data.update(self._pending)
+        self._data = data
+        self._signature = signature
+        self._version += 1
+        self.loads += 1
+
+    def data(self) -> dict:
+        """
+        The library, re-read first if the file changed on disk.
+
+        A snapshot: save() swaps in a new dict rather than changing this one,
+        so callers can iterate it while other threads save.
+        """
+        signature = self._stat()
+        with self._lock:
+            if self._data is None or signature != self._signature:
+                self._load(signature)
+            return self._data
+
+    def search(self) -> SuggestIndex:
+        """Search index over the names, rebuilt only after changes."""
+        data = self.data()
+        with self._lock:
+            if self._search is None or self._search[0] != self._version:
+                self._search = (self._version, SuggestIndex(data))
+            return self._search[1]
+
+    def save(self, name: str, uri: str):
+        """Add or replace a track; written to disk within flush_delay."""
+        self.data()
+        with self._lock:
+            # Copy on write; dj_save is rare next to lookups and listings
+            self._data = {**self._data, name: uri}
+            self._pending[name] = uri
+            self._version += 1
+            self.saves += 1
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_behind, daemon=True,
+                                                name="library-writer")
+                self._writer.start()
+        self._wake.set()
+
+    def _write_behind(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            # Let a burst of saves pile up, then write them all at once
+            time.sleep(self.flush_delay)
+            self.flush()
+
+    def flush(self):
+        """Write pending saves now (no-op if there are none)."""
+        with self._write_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                pending, self._pending = self._pending, {}
+                data = json.dumps(self._data, indent=2)
+            try:
+                atomic_write(self.path, data)
+            except OSError:
+                with self._lock:
+                    # Keep them for the next attempt; newer saves win
+                    self._pending = {**pending, **self._pending}
+                    self.write_errors += 1
+                return
+            with self._lock:
+                self.writes += 1
+                # Our own write isn't a change data() should reload for
+                self._signature = self._stat()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"tracks": len(self._data or {}), "loads": self.loads, "saves": self.saves,
+                    "writes": self.writes, "pending": len(self._pending),
+                    "write_errors": self.write_errors}
+
+
+_libraries = []
+
+
+def open_library(path: Path, flush_delay: float = 1.0) -> TrackLibrary:
+    """A TrackLibrary whose pending saves are flushed at interpreter exit."""
+    library = TrackLibrary(path, flush_delay)
+    _libraries.append(library)
+    return library
+
+
+@atexit.register
+def _flush_all():
+    for library in _libraries:
+        library.flush()
@@ -0,0 +1,386 @@
+"""
+Synced lyrics from LRCLIB, behind a shared on-disk + in-memory cache.
+
+Both the MCP (dj_lyrics, dj_speak) and build_words_v2 go through
+fetch_synced_lyrics, so looking at a song's lyrics and then speaking a
+line, or rebuilding the word index, doesn't hit lrclib.net again.
+
+Cache entries are keyed by a hash of the normalized (artist, track) and
+hold the parsed lines. Songs without synced lyrics are cached too (for a
+shorter time) so we don't keep asking. Network errors are never cached.
+"""
+
+import bisect
+import functools
+import hashlib
+import json
+import operator
+import os
+import re
+import threading
+import time
+import unicodedata
+import urllib.parse
+from collections import OrderedDict
+from pathlib import Path
+
+from httppool import get_client
+from storage import atomic_write
+
+LRCLIB_URL = os.environ.get("CLAUDE_DJ_LRCLIB_URL", "https://lrclib.net")
+LYRICS_CACHE_DIR = Path(__file__).parent / "lyrics_cache"
+
+DAY = 24 * 60 * 60
+
+
+class LyricsUnavailable(Exception):
+    """LRCLIB couldn't be reached (as opposed to having no lyrics)."""
+
+
+def normalize(text: str) -> str:
+    """Case-, accent- and whitespace-insensitive form of a name."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.split())
+
+
+def cache_key(artist: str, track: str) -> str:
+    return hashlib.sha1(f"{normalize(artist)}\0{normalize(track)}".encode()).hexdigest()
+
+
+class LyricsCache:
+    """
+    Parsed lyrics on disk (one small JSON file per song), with an in-memory
+    LRU in front.
+
+    Positive entries live for `ttl` seconds, "no synced lyrics" entries for
+    `negative_ttl`. When the directory grows past max_bytes the least
+    recently used files are evicted.
+    """
+
+    def __init__(self, directory: Path = LYRICS_CACHE_DIR, ttl: float = 30 * DAY,
+                 negative_ttl: float = DAY, max_bytes: int = 50_000_000,
+                 memory_entries: int = 256):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "negative_hits": 0,
+                         "misses": 0, "expired": 0, "stores": 0, "evictions": 0}
+        self._memory = OrderedDict()
+        self._sizes = None  # path -> size, loaded on first store
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _expired(self, entry: dict) -> bool:
+        ttl = self.ttl if entry["lines"] is not None else self.negative_ttl
+        return time.time() - entry["fetched"] > ttl
+
+    def _remember(self, key: str, entry: dict):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, artist: str, track: str):
+        """
+        (found, lines). lines is a list of (time, text, word_times) tuples
+        (see parse_synced), or None for a cached "no synced lyrics".
+        """
+        key = cache_key(artist, track)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry):
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return self._hit(entry)
+
+            path = self._path(key)
+            try:
+                entry = json.loads(path.read_text())
+            except (OSError, ValueError):
+                self.counters["misses"] += 1
+                return False, None
+            if self._expired(entry):
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return False, None
+            try:
+                os.utime(path)  # mtime doubles as "last used" for eviction
+            except OSError:
+                pass
+            if entry["lines"] is not None:
+                # Entries cached before word timings were parsed are (time, text)
+                entry["lines"] = [_line(*line) for line in entry["lines"]]
+            self._remember(key, entry)
+            self.counters["disk_hits"] += 1
+            return self._hit(entry)
+
+    def _hit(self, entry: dict):
+        if entry["lines"] is None:
+            self.counters["negative_hits"] += 1
+        return True, entry["lines"]
+
+    def put(self, artist: str, track: str, lines):
+        """Store parsed lines, or None to remember there are none."""
+        key = cache_key(artist, track)
+        entry = {"artist": artist, "track": track, "fetched": time.time(),
+                 "lines": [_line(*line) for line in lines] if lines is not None else None}
+        data = json.dumps(entry, ensure_ascii=False).encode()
+        path = self._path(key)
+        with self._lock:
+            self._remember(key, entry)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write(path, data)
+            except OSError:
+                return  # a read-only checkout still gets the memory layer
+            self.counters["stores"] += 1
+            sizes = self._disk_sizes()
+            sizes[path] = len(data)
+            if sum(sizes.values()) > self.max_bytes:
+                self._evict(sizes)
+
+    def _disk_sizes(self) -> dict:
+        if self._sizes is None:
+            self._sizes = {p: p.stat().st_size for p in self.directory.glob("*/*.json")}
+        return self._sizes
+
+    def _evict(self, sizes: dict):
+        """Drop least recently used files until we're at 90% of max_bytes."""
+        def last_used(path):
+            try:
+                return path.stat().st_mtime
+            except OSError:
+                return 0
+        total = sum(sizes.values())
+        for path in sorted(sizes, key=last_used):
+            if total <= self.max_bytes * 0.9:
+                break
+            total -= sizes.pop(path)
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            self._memory.pop(path.stem, None)
+            self.counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self._memory)
+            if self._sizes is not None:
+                stats["disk_entries"] = len(self._sizes)
+                stats["disk_bytes"] = sum(self._sizes.values())
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        stats["hit_rate"] = hits / (hits + stats["misses"]) if hits + stats["misses"] else 0.0
+        return stats
+
+
+# ============ LRCLIB ============
+
+# [mm:ss.xx] text, also [mm:ss] and [mm:ss:xx]. The text can start with
+# more timestamps ([00:12.00][01:30.00] chorus).
+_TIME_LINE = re.compile(r'\s*\[(\d+:\d+(?:[.:]\d+)?)\]\s*(.*)')
+# Every timestamped line (stamp, text) or [offset:+/-ms] tag (shift) of a
+# whole song in one findall
+_LRC_ROWS = re.compile(r'^[ \t]*(?:\[(\d+:\d+(?:[.:]\d+)?)\][ \t]*(.*)'
+                       r'|\[(?i:offset):[ \t]*([+-]?\d+)[ \t]*\])', re.MULTILINE)
+# Enhanced LRC: <mm:ss.xx> before each word (or syllable group)
+_WORD_TAG = re.compile(r'<(\d+:\d+(?:[.:]\d+)?)>')
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def _seconds(stamp: str) -> float:
+    """An LRC timestamp (mm:ss.xx, mm:ss or mm:ss:xx) in seconds.
+
+    Cached: songs share most of their timestamps, and a dict hit is
+    cheaper than int() + float().
+    """
+    minutes, _, seconds = stamp.partition(":")
+    if ":" in seconds:
+        seconds = seconds.replace(":", ".")
+    return int(minutes) * 60 + float(seconds)
+
+
+def _line(time, text, word_times=None) -> tuple:
+    if word_times is not None:
+        word_times = tuple(tuple(w) for w in word_times)
+    return (time, text, word_times)
+
+
+def _word_times(text: str, start: float):
+    """(text without tags, word_times) for a line with <mm:ss.xx> tags."""
+    parts = _WORD_TAG.split(text)
+    if len(parts) == 1:
+        return text, None
+    # parts = [before, stamp, text, stamp, text, ...]; untagged words
+    # before the first tag start with the line
+    word_times = [(start, parts[0])] if parts[0].strip() else []
+    word_times += zip(map(_seconds, parts[1::2]), parts[2::2])
+    return " ".join("".join(parts[::2]).split()), tuple(word_times)
+
+
+def iter_synced(lines):
+    """
+    Stream (seconds, text, word_times) tuples from LRC text (a str or any
+    iterable of lines, e.g. an open file; songs are small, so it's read in
+    full first), in file order.
+
+    A line with several timestamps ([00:12.00][01:30.00] chorus) yields
+    one tuple per timestamp. [offset:+/-ms] shifts every timestamp after
+    it (positive = earlier, as in the LRC spec). Lines without lyrics and
+    other tags are skipped.
+
+    word_times is None for plain LRC. For enhanced LRC it's
+    ((seconds, text), ...) - one entry per <mm:ss.xx> tag with the raw text
+    up to the next tag, so joining the texts gives back the line with its
+    spacing - and the tags are removed from the line text.
+    """
+    source = lines if isinstance(lines, str) else "\n".join(lines)
+    if "\r" in source:
+        source = "\n".join(source.splitlines())
+    match_line = _TIME_LINE.match
+    offset = 0.0
+    # One regex pass over the whole song finds the lines worth looking at
+    for stamp, text, shift in _LRC_ROWS.findall(source):
+        if not stamp:
+            offset = int(shift) / 1000
+            continue
+        timestamp = _seconds(stamp)
+        text = text.rstrip()
+        times = None
+        if text[:1] == "[":
+            times = [timestamp]
+            match = match_line(text)
+            while match is not None:
+                stamp, text = match.groups()
+                times.append(_seconds(stamp))
+                match = match_line(text)
+            text = text.rstrip()
+        if not text:  # Only include lines with actual lyrics
+            continue
+        word_times = None
+        if "<" in text:
+            text, word_times = _word_times(text, timestamp)
+            if not text:
+                continue
+        if times is None and not offset:
+            yield (timestamp, text, word_times)
+            continue
+        for t in times or (timestamp,):
+            words = word_times
+            if word_times is not None:
+                # Word tags are absolute, written for the first timestamp
+                shift = t - timestamp - offset
+                if shift:
+                    words = tuple((_shifted(w, shift), part) for w, part in word_times)
+            yield (_shifted(t, -offset) if offset else t, text, words)
+
+
+def _shifted(t: float, shift: float) -> float:
+    t += shift
+    return round(t, 3) if t > 0 else 0.0
+
+
+_by_time = operator.itemgetter(0)
+
+
+def parse_synced(synced: str) -> list:
+    """
+    Parse LRC text into [(seconds, text, word_times)], sorted by time (see
+    iter_synced).
+    """
+    lines = list(iter_synced(synced))
+    # Already sorted unless a line had several timestamps; sort is stable
+    # and linear on sorted input, so plain files come out as they went in
+    lines.sort(key=_by_time)
+    return lines
+
+
+class TimedLyrics:
+    """
+    A song's lines (see parse_synced) with their start times in a sorted
+    list of their own, so finding the line sung at a position is a bisect.
+    """
+
+    def __init__(self, lines):
+        self.lines = sorted(lines, key=_by_time)
+        self.times = [line[0] for line in self.lines]
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def index_at(self, seconds: float) -> int:
+        """Index of the line being sung at `seconds` (-1 before the first)."""
+        return bisect.bisect_right(self.times, seconds) - 1
+
+    def next_time(self, seconds: float):
+        """When the next line after `seconds` starts (None after the last)."""
+        i = bisect.bisect_right(self.times, seconds)
+        return self.times[i] if i < len(self.times) else None
+
+
+def download_synced(artist: str, track: str, timeout: float = 10) -> str:
+    """
+    Raw synced LRC text from LRCLIB ("" if it has none).
+
+    Raises LyricsUnavailable on network trouble, so that doesn't get cached
+    as "no lyrics".
+    """
+    query = urllib.parse.urlencode({
+        "artist_name": artist,
+        "track_name": track
+    })
+    url = f"{LRCLIB_URL}/api/get?{query}"
+    try:
+        response = get_client().get(url, timeout=timeout)
+        if response.status == 404:
+            return ""
+        if response.status != 200:
+            raise LyricsUnavailable(f"LRCLIB returned {response.status}")
+        data = response.json()
+    except (OSError, ValueError) as e:
+        raise LyricsUnavailable(str(e))
+    return data.get("syncedLyrics") or ""
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LyricsCache:
+    """The process-wide lyrics cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LyricsCache()
+    return _cache
+
+
+def get_synced_lyrics(artist: str, track: str) -> list:
+    """
+    [(seconds, text, word_times)] for a song, from the cache or LRCLIB ([] if
+    it has none).
+
+    Raises LyricsUnavailable if LRCLIB can't be reached, for callers that
+    want to retry.
+    """
+    cache = get_cache()
+    found, lines = cache.get(artist, track)
+    if found:
+        return lines or []
+    lines = parse_synced(download_synced(artist, track))
+    cache.put(artist, track, lines or None)
+    return lines
+
+
+def fetch_synced_lyrics(artist: str, track: str) -> list:
+    """Like get_synced_lyrics, but [] when LRCLIB can't be reached."""
+    try:
+        return get_synced_lyrics(artist, track)
+    except LyricsUnavailable:
+        return []
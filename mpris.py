@@ -0,0 +1,875 @@
+"""
+MPRIS transport layer - how claude-dj talks to Spotify over D-Bus.
+
+Two interchangeable transports with the same interface:
+- NativeTransport: one long-lived session-bus connection that speaks the
+  D-Bus wire protocol directly. Pure Python, no extra dependencies.
+- DbusSendTransport: forks `dbus-send` for every call. Slow, but it works
+  anywhere dbus-send does, so it stays around as the fallback.
+
+Pick one with CLAUDE_DJ_TRANSPORT=native|dbus-send (default: auto, which
+tries native first).
+"""
+
+import os
+import re
+import socket
+import struct
+import subprocess
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass, field
+
+SPOTIFY_DEST = "org.mpris.MediaPlayer2.spotify"
+MPRIS_PATH = "/org/mpris/MediaPlayer2"
+PLAYER_IFACE = "org.mpris.MediaPlayer2.Player"
+PROPS_IFACE = "org.freedesktop.DBus.Properties"
+
+BUS_NAME = "org.freedesktop.DBus"
+BUS_PATH = "/org/freedesktop/DBus"
+
+# Message types
+METHOD_CALL, METHOD_RETURN, ERROR, SIGNAL = 1, 2, 3, 4
+NO_REPLY_EXPECTED = 0x1
+
+# Header field codes
+PATH, INTERFACE, MEMBER, ERROR_NAME, REPLY_SERIAL, DESTINATION, SENDER, SIGNATURE = range(1, 9)
+_FIELD_TYPES = {PATH: "o", INTERFACE: "s", MEMBER: "s", ERROR_NAME: "s",
+                REPLY_SERIAL: "u", DESTINATION: "s", SENDER: "s", SIGNATURE: "g"}
+
+
+class MprisError(Exception):
+    """Spotify couldn't be reached or rejected the call."""
+
+
+class DBusError(MprisError):
+    """An error reply from the other end of the bus."""
+
+    def __init__(self, name: str, text: str = ""):
+        super().__init__(f"{name}: {text}" if text else name)
+        self.name = name
+
+
+# ============ WIRE FORMAT ============
+
+# type code -> (struct format, size/alignment)
+_FIXED = {
+    "y": ("B", 1), "b": ("I", 4), "n": ("h", 2), "q": ("H", 2),
+    "i": ("i", 4), "u": ("I", 4), "x": ("q", 8), "t": ("Q", 8),
+    "d": ("d", 8), "h": ("I", 4),
+}
+_ALIGN = {k: size for k, (_, size) in _FIXED.items()}
+_ALIGN.update({"s": 4, "o": 4, "g": 1, "a": 4, "v": 1, "(": 8, "{": 8})
+
+
+def _type_end(sig: str, i: int) -> int:
+    """Index just past the single complete type starting at sig[i]."""
+    c = sig[i]
+    if c == "a":
+        return _type_end(sig, i + 1)
+    if c in "({":
+        close = ")" if c == "(" else "}"
+        i += 1
+        while sig[i] != close:
+            i = _type_end(sig, i)
+    return i + 1
+
+
+def split_signature(sig: str) -> list:
+    """Split a signature like 'sa{sv}as' into ['s', 'a{sv}', 'as']."""
+    types, i = [], 0
+    while i < len(sig):
+        end = _type_end(sig, i)
+        types.append(sig[i:end])
+        i = end
+    return types
+
+
+class _Writer:
+    """Little-endian marshaller. Variants are passed as (signature, value)."""
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def align(self, n: int):
+        self.buf.extend(b"\0" * (-len(self.buf) % n))
+
+    def write(self, t: str, value):
+        c = t[0]
+        if c in _FIXED:
+            fmt, size = _FIXED[c]
+            self.align(size)
+            self.buf.extend(struct.pack("<" + fmt, value))
+        elif c in "so":
+            data = value.encode()
+            self.align(4)
+            self.buf.extend(struct.pack("<I", len(data)) + data + b"\0")
+        elif c == "g":
+            data = value.encode()
+            self.buf.extend(bytes([len(data)]) + data + b"\0")
+        elif c == "v":
+            sig, inner = value
+            self.write("g", sig)
+            self.write(sig, inner)
+        elif c == "a":
+            self.align(4)
+            len_pos = len(self.buf)
+            self.buf.extend(b"\0\0\0\0")
+            elem = t[1:]
+            self.align(_ALIGN[elem[0]])
+            start = len(self.buf)
+            items = value.items() if elem[0] == "{" else value
+            for item in items:
+                self.write(elem, item)
+            struct.pack_into("<I", self.buf, len_pos, len(self.buf) - start)
+        elif c in "({":
+            self.align(8)
+            for sub, v in zip(split_signature(t[1:-1]), value):
+                self.write(sub, v)
+        else:
+            raise ValueError(f"Unsupported D-Bus type: {t}")
+
+
+class _Reader:
+    """Unmarshaller. Variants come back as plain values, a{..} as dicts."""
+
+    def __init__(self, data: bytes, endian: str = "<", pos: int = 0):
+        self.data = data
+        self.endian = endian
+        self.pos = pos
+
+    def align(self, n: int):
+        self.pos += -self.pos % n
+
+    def _unpack(self, fmt: str, size: int):
+        self.align(size)
+        (value,) = struct.unpack_from(self.endian + fmt, self.data, self.pos)
+        self.pos += size
+        return value
+
+    def read(self, t: str):
+        c = t[0]
+        if c in _FIXED:
+            value = self._unpack(*_FIXED[c])
+            return bool(value) if c == "b" else value
+        if c in "so":
+            n = self._unpack("I", 4)
+            value = self.data[self.pos:self.pos + n].decode("utf-8", "replace")
+            self.pos += n + 1
+            return value
+        if c == "g":
+            n = self.data[self.pos]
+            value = self.data[self.pos + 1:self.pos + 1 + n].decode()
+            self.pos += n + 2
+            return value
+        if c == "v":
+            return self.read(self.read("g"))
+        if c == "a":
+            n = self._unpack("I", 4)
+            elem = t[1:]
+            self.align(_ALIGN[elem[0]])
+            end = self.pos + n
+            if elem[0] == "{":
+                result = {}
+                while self.pos < end:
+                    key, value = self.read(elem)
+                    result[key] = value
+                return result
+            items = []
+            while self.pos < end:
+                items.append(self.read(elem))
+            return items
+        if c in "({":
+            self.align(8)
+            return tuple(self.read(sub) for sub in split_signature(t[1:-1]))
+        raise ValueError(f"Unsupported D-Bus type: {t}")
+
+
+class Message:
+    """A parsed D-Bus message."""
+
+    __slots__ = ("type", "flags", "serial", "fields", "body")
+
+    def __init__(self, type: int, flags: int, serial: int, fields: dict, body: list):
+        self.type = type
+        self.flags = flags
+        self.serial = serial
+        self.fields = fields
+        self.body = body
+
+    path = property(lambda self: self.fields.get(PATH))
+    interface = property(lambda self: self.fields.get(INTERFACE))
+    member = property(lambda self: self.fields.get(MEMBER))
+    error_name = property(lambda self: self.fields.get(ERROR_NAME))
+    reply_serial = property(lambda self: self.fields.get(REPLY_SERIAL))
+    sender = property(lambda self: self.fields.get(SENDER))
+    signature = property(lambda self: self.fields.get(SIGNATURE, ""))
+
+
+def build_message(mtype: int, serial: int, fields: dict, signature: str = "",
+                  body=(), flags: int = 0) -> bytes:
+    """Marshal a complete message. `fields` maps header codes to values."""
+    body_w = _Writer()
+    for t, value in zip(split_signature(signature), body):
+        body_w.write(t, value)
+    fields = dict(fields)
+    if signature:
+        fields[SIGNATURE] = signature
+
+    head = _Writer()
+    head.buf.extend(struct.pack("<cBBBII", b"l", mtype, flags, 1, len(body_w.buf), serial))
+    head.write("a(yv)", [(code, (_FIELD_TYPES[code], v)) for code, v in sorted(fields.items())])
+    head.align(8)
+    return bytes(head.buf + body_w.buf)
+
+
+def message_length(buf) -> int:
+    """Total length of the message at the start of buf (needs 16 bytes)."""
+    endian = "<" if buf[0:1] == b"l" else ">"
+    body_len, = struct.unpack_from(endian + "I", buf, 4)
+    fields_len, = struct.unpack_from(endian + "I", buf, 12)
+    header_len = 16 + fields_len
+    return header_len + (-header_len % 8) + body_len
+
+
+def parse_message(data: bytes) -> Message:
+    endian = "<" if data[0:1] == b"l" else ">"
+    mtype, flags, _, _, serial = struct.unpack_from(endian + "BBBII", data, 1)
+    r = _Reader(data, endian, 12)
+    fields = dict(r.read("a(yv)"))
+    r.align(8)
+    body = [r.read(t) for t in split_signature(fields.get(SIGNATURE, ""))]
+    return Message(mtype, flags, serial, fields, body)
+
+
+# ============ CONNECTION ============
+
+def session_bus_address() -> str:
+    address = os.environ.get("DBUS_SESSION_BUS_ADDRESS")
+    if address:
+        return address
+    return f"unix:path=/run/user/{os.getuid()}/bus"
+
+
+def _open_socket(address: str, timeout: float) -> socket.socket:
+    for entry in address.split(";"):
+        kind, _, params = entry.partition(":")
+        if kind != "unix":
+            continue
+        opts = dict(p.split("=", 1) for p in params.split(",") if "=" in p)
+        if "path" in opts:
+            target = urllib.parse.unquote(opts["path"])
+        elif "abstract" in opts:
+            target = "\0" + urllib.parse.unquote(opts["abstract"])
+        else:
+            continue
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(target)
+            return sock
+        except OSError:
+            sock.close()
+    raise MprisError(f"Can't connect to D-Bus at {address!r}")
+
+
+def _authenticate(sock: socket.socket):
+    """SASL EXTERNAL handshake - the bus already knows our uid."""
+    uid = str(os.getuid()).encode().hex().encode()
+    sock.sendall(b"\0AUTH EXTERNAL " + uid + b"\r\n")
+    reply = b""
+    while not reply.endswith(b"\r\n"):
+        chunk = sock.recv(256)
+        if not chunk:
+            raise MprisError("D-Bus closed the connection during auth")
+        reply += chunk
+    if not reply.startswith(b"OK "):
+        raise MprisError(f"D-Bus auth rejected: {reply.decode(errors='replace').strip()}")
+    sock.sendall(b"BEGIN\r\n")
+
+
+class Connection:
+    """
+    A persistent session-bus connection.
+
+    A reader thread routes replies back to whoever is waiting in call(),
+    hands signals to signal_handlers and method calls to on_method_call.
+    Handlers run on the reader thread, so they must not block on call().
+    """
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.closed = False
+        self.signal_handlers = []
+        self.on_method_call = None
+        self._serial = 0
+        self._pending = {}
+        self._send_lock = threading.Lock()
+        sock.settimeout(None)
+        self._reader = threading.Thread(target=self._read_loop, name="dbus-reader", daemon=True)
+        self._reader.start()
+        self.unique_name = self.call(BUS_NAME, BUS_PATH, BUS_NAME, "Hello")[0]
+
+    @classmethod
+    def open(cls, address: str = None, timeout: float = 5.0) -> "Connection":
+        sock = _open_socket(address or session_bus_address(), timeout)
+        try:
+            _authenticate(sock)
+            return cls(sock)
+        except (OSError, MprisError) as e:
+            sock.close()
+            raise MprisError(f"D-Bus connect failed: {e}")
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _send(self, mtype: int, fields: dict, signature: str = "", body=(), flags: int = 0):
+        """Send a message. Returns the [event, reply, serial] slot for method calls."""
+        slot = None
+        with self._send_lock:
+            self._serial += 1
+            serial = self._serial
+            data = build_message(mtype, serial, fields, signature, body, flags)
+            if mtype == METHOD_CALL and not flags & NO_REPLY_EXPECTED:
+                slot = self._pending[serial] = [threading.Event(), None, serial]
+            try:
+                self.sock.sendall(data)
+            except OSError as e:
+                self._pending.pop(serial, None)
+                raise MprisError(f"D-Bus send failed: {e}")
+        return slot
+
+    def call(self, dest: str, path: str, iface: str, member: str,
+             signature: str = "", args=(), timeout: float = 5.0) -> list:
+        """Call a method and wait for its reply body."""
+        if self.closed:
+            raise MprisError("D-Bus connection closed")
+        fields = {PATH: path, INTERFACE: iface, MEMBER: member, DESTINATION: dest}
+        slot = self._send(METHOD_CALL, fields, signature, args)
+        if not slot[0].wait(timeout):
+            self._pending.pop(slot[2], None)
+            raise MprisError(f"Timeout waiting for {member}")
+        reply = slot[1]
+        if reply is None:
+            raise MprisError("D-Bus connection closed")
+        if reply.type == ERROR:
+            text = reply.body[0] if reply.body and isinstance(reply.body[0], str) else ""
+            raise DBusError(reply.error_name, text)
+        return reply.body
+
+    def call_no_reply(self, dest: str, path: str, iface: str, member: str,
+                      signature: str = "", args=()):
+        """Fire-and-forget method call."""
+        fields = {PATH: path, INTERFACE: iface, MEMBER: member, DESTINATION: dest}
+        self._send(METHOD_CALL, fields, signature, args, NO_REPLY_EXPECTED)
+
+    def emit(self, path: str, iface: str, member: str, signature: str = "", args=()):
+        self._send(SIGNAL, {PATH: path, INTERFACE: iface, MEMBER: member}, signature, args)
+
+    def reply(self, msg: Message, signature: str = "", args=()):
+        if msg.flags & NO_REPLY_EXPECTED:
+            return
+        fields = {REPLY_SERIAL: msg.serial}
+        if msg.sender:
+            fields[DESTINATION] = msg.sender
+        self._send(METHOD_RETURN, fields, signature, args)
+
+    def reply_error(self, msg: Message, name: str, text: str = ""):
+        if msg.flags & NO_REPLY_EXPECTED:
+            return
+        fields = {REPLY_SERIAL: msg.serial, ERROR_NAME: name}
+        if msg.sender:
+            fields[DESTINATION] = msg.sender
+        self._send(ERROR, fields, "s" if text else "", (text,) if text else ())
+
+    def _read_loop(self):
+        buf = bytearray()
+        try:
+            while True:
+                chunk = self.sock.recv(65536)
+                if not chunk:
+                    break
+                buf += chunk
+                while len(buf) >= 16:
+                    n = message_length(buf)
+                    if len(buf) < n:
+                        break
+                    msg = parse_message(bytes(buf[:n]))
+                    del buf[:n]
+                    self._dispatch(msg)
+        except (OSError, ValueError, struct.error):
+            pass
+        finally:
+            self.closed = True
+            for serial in list(self._pending):
+                slot = self._pending.pop(serial, None)
+                if slot:
+                    slot[0].set()
+
+    def _dispatch(self, msg: Message):
+        if msg.type in (METHOD_RETURN, ERROR):
+            slot = self._pending.pop(msg.reply_serial, None)
+            if slot:
+                slot[1] = msg
+                slot[0].set()
+        elif msg.type == SIGNAL:
+            for handler in list(self.signal_handlers):
+                try:
+                    handler(msg)
+                except Exception:
+                    pass
+        elif msg.type == METHOD_CALL:
+            if self.on_method_call:
+                try:
+                    self.on_method_call(msg)
+                except Exception as e:
+                    self.reply_error(msg, "org.freedesktop.DBus.Error.Failed", str(e))
+            else:
+                self.reply_error(msg, "org.freedesktop.DBus.Error.UnknownMethod", msg.member or "")
+
+
+# ============ PLAYER STATE ============
+
+def trackid_to_uri(trackid: str) -> str:
+    """/com/spotify/track/XYZ -> spotify:track:XYZ (URIs pass through)."""
+    if trackid.startswith("/com/spotify/"):
+        return "spotify:" + trackid[len("/com/spotify/"):].replace("/", ":")
+    return trackid
+
+
+@dataclass
+class PlayerState:
+    """Everything on the Player interface, from one GetAll round-trip."""
+
+    status: str = "Unknown"
+    metadata: dict = field(default_factory=dict)
+    position_us: int = 0
+    volume: float = 0.0
+    rate: float = 1.0
+
+    @classmethod
+    def from_properties(cls, props: dict) -> "PlayerState":
+        status = props.get("PlaybackStatus")
+        return cls(
+            status=status if status in ("Playing", "Paused", "Stopped") else "Unknown",
+            metadata=props.get("Metadata") or {},
+            position_us=int(props.get("Position") or 0),
+            volume=float(props.get("Volume") or 0.0),
+            rate=float(props.get("Rate") or 1.0),
+        )
+
+    @property
+    def title(self) -> str:
+        return self.metadata.get("xesam:title", "")
+
+    @property
+    def artist(self) -> str:
+        artists = self.metadata.get("xesam:artist") or [""]
+        return artists[0] if isinstance(artists, list) else artists
+
+    @property
+    def album(self) -> str:
+        return self.metadata.get("xesam:album", "")
+
+    @property
+    def trackid(self) -> str:
+        """Raw mpris:trackid, what SetPosition wants."""
+        return self.metadata.get("mpris:trackid", "")
+
+    @property
+    def uri(self) -> str:
+        return trackid_to_uri(self.trackid)
+
+    @property
+    def length_sec(self) -> float:
+        return (self.metadata.get("mpris:length") or 0) / 1_000_000
+
+    @property
+    def position_sec(self) -> float:
+        return self.position_us / 1_000_000
+
+
+# ============ TRANSPORTS ============
+
+class Transport:
+    """What every transport provides: Player calls and property reads."""
+
+    name = "?"
+
+    def call(self, method: str, signature: str = "", *args) -> list:
+        raise NotImplementedError
+
+    def get_property(self, prop: str):
+        raise NotImplementedError
+
+    def get_all(self) -> dict:
+        """All Player properties in one round-trip."""
+        raise NotImplementedError
+
+    def player_state(self) -> PlayerState:
+        return PlayerState.from_properties(self.get_all())
+
+    def close(self):
+        pass
+
+
+class NativeTransport(Transport):
+    """MPRIS over a single persistent session-bus connection."""
+
+    name = "native"
+
+    def __init__(self, dest: str = SPOTIFY_DEST, address: str = None, timeout: float = 5.0):
+        self.dest = dest
+        self.address = address
+        self.timeout = timeout
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def connection(self) -> Connection:
+        """The live connection, reconnecting if the old one dropped."""
+        with self._lock:
+            if self._conn is None or self._conn.closed:
+                self._conn = Connection.open(self.address, self.timeout)
+            return self._conn
+
+    def call(self, method: str, signature: str = "", *args) -> list:
+        return self.connection().call(self.dest, MPRIS_PATH, PLAYER_IFACE, method,
+                                      signature, args, self.timeout)
+
+    def get_property(self, prop: str):
+        return self.connection().call(self.dest, MPRIS_PATH, PROPS_IFACE, "Get",
+                                      "ss", (PLAYER_IFACE, prop), self.timeout)[0]
+
+    def get_all(self) -> dict:
+        return self.connection().call(self.dest, MPRIS_PATH, PROPS_IFACE, "GetAll",
+                                      "s", (PLAYER_IFACE,), self.timeout)[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_DBUS_SEND_TYPES = {
+    "s": "string", "o": "objpath", "y": "byte", "b": "boolean", "n": "int16",
+    "q": "uint16", "i": "int32", "u": "uint32", "x": "int64", "t": "uint64", "d": "double",
+}
+
+_REPLY_TOKEN = re.compile(r"""
+    (?P<open>array\ \[|dict\ entry\(|struct\ \{)
+  | (?P<close>[\]\)\}])
+  | (?P<variant>variant)\b
+  | (?:string|object\ path|signature)\ "(?P<text>.*)"$
+  | (?P<int>u?int(?:16|32|64)|byte)\ (?P<intval>-?\d+)
+  | double\ (?P<double>\S+)
+  | boolean\ (?P<bool>true|false)
+""", re.X | re.M)
+
+
+def parse_print_reply(text: str) -> list:
+    """Turn `dbus-send --print-reply` output back into Python values."""
+    _, _, text = text.partition("\n")  # "method return time=..." header
+    tokens = []
+    for m in _REPLY_TOKEN.finditer(text):
+        if m.group("open"):
+            tokens.append(("open", m.group("open")[0]))
+        elif m.group("close"):
+            tokens.append(("close", None))
+        elif m.group("variant"):
+            continue  # variants unwrap to their contents
+        elif m.group("text") is not None:
+            tokens.append(("value", m.group("text")))
+        elif m.group("int"):
+            tokens.append(("value", int(m.group("intval"))))
+        elif m.group("double"):
+            tokens.append(("value", float(m.group("double"))))
+        else:
+            tokens.append(("value", m.group("bool") == "true"))
+
+    pos = 0
+
+    def value():
+        nonlocal pos
+        kind, val = tokens[pos]
+        pos += 1
+        if kind == "value":
+            return val
+        items = []
+        while pos < len(tokens) and tokens[pos][0] != "close":
+            items.append(value())
+        pos += 1
+        if val == "a":
+            if items and isinstance(items[0], _Entry):
+                return dict(items)
+            return items
+        if val == "d":
+            return _Entry(items)
+        return tuple(items)
+
+    values = []
+    while pos < len(tokens):
+        values.append(value())
+    return values
+
+
+class _Entry(tuple):
+    """A dict entry while parsing dbus-send output."""
+
+
+class DbusSendTransport(Transport):
+    """MPRIS by forking dbus-send for every call (the original approach)."""
+
+    name = "dbus-send"
+
+    def __init__(self, dest: str = SPOTIFY_DEST, timeout: float = 5.0):
+        self.dest = dest
+        self.timeout = timeout
+
+    def _run(self, member: str, signature: str, args) -> list:
+        cmd = ["dbus-send", "--print-reply", f"--dest={self.dest}", MPRIS_PATH, member]
+        for t, value in zip(split_signature(signature), args):
+            if t == "b":
+                value = "true" if value else "false"
+            cmd.append(f"{_DBUS_SEND_TYPES[t]}:{value}")
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            raise MprisError("Timeout waiting for Spotify")
+        except OSError as e:
+            raise MprisError(str(e))
+        if result.returncode != 0:
+            raise MprisError(result.stderr.strip() or "dbus-send failed")
+        return parse_print_reply(result.stdout)
+
+    def call(self, method: str, signature: str = "", *args) -> list:
+        return self._run(f"{PLAYER_IFACE}.{method}", signature, args)
+
+    def get_property(self, prop: str):
+        values = self._run(f"{PROPS_IFACE}.Get", "ss", (PLAYER_IFACE, prop))
+        if not values:
+            raise MprisError(f"Empty reply for {prop}")
+        return values[0]
+
+    def get_all(self) -> dict:
+        values = self._run(f"{PROPS_IFACE}.GetAll", "s", (PLAYER_IFACE,))
+        if not values or not isinstance(values[0], dict):
+            return {}
+        return values[0]
+
+
+def open_transport(kind: str = None):
+    """
+    Build the transport named by `kind` or $CLAUDE_DJ_TRANSPORT.
+
+    "auto" (the default) uses the native connection when the session bus
+    is reachable and falls back to dbus-send otherwise.
+    """
+    kind = kind or os.environ.get("CLAUDE_DJ_TRANSPORT", "auto")
+    if kind == "dbus-send":
+        return DbusSendTransport()
+    native = NativeTransport()
+    if kind == "native":
+        return native
+    try:
+        native.connection()
+        return native
+    except MprisError:
+        return DbusSendTransport()
+
+
+# ============ SIGNAL-FED CACHE ============
+
+_MATCH_RULES = [
+    f"type='signal',sender='{SPOTIFY_DEST}',path='{MPRIS_PATH}',"
+    f"interface='{PROPS_IFACE}',member='PropertiesChanged'",
+    f"type='signal',sender='{SPOTIFY_DEST}',path='{MPRIS_PATH}',"
+    f"interface='{PLAYER_IFACE}',member='Seeked'",
+    f"type='signal',sender='{BUS_NAME}',interface='{BUS_NAME}',"
+    f"member='NameOwnerChanged',arg0='{SPOTIFY_DEST}'",
+]
+
+
+class PlayerCache:
+    """
+    Always-current player state, fed by MPRIS signals.
+
+    Subscribes to PropertiesChanged and Seeked on the native connection and
+    extrapolates the position from the last anchor with the monotonic clock,
+    so reads normally cost no bus traffic at all. Falls back to a GetAll poll
+    when the cache is cold, older than max_age (to re-anchor the clock), or
+    the transport can't deliver signals (dbus-send). `counters` records how
+    often each of those happens.
+    """
+
+    def __init__(self, transport: Transport, max_age: float = 30.0):
+        self.transport = transport
+        self.max_age = max_age
+        self.counters = {"hits": 0, "polls": 0, "cold": 0, "stale": 0,
+                         "forced": 0, "no_signals": 0, "signals": 0}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # Serializes subscribing. Not self._lock: signals are handled on the
+        # bus reader thread, which also delivers the AddMatch replies
+        self._subscribe_lock = threading.Lock()
+        self._version = 0
+        self._track_version = 0  # Metadata signals seen
+        self._conn = None
+        self._owner = None
+        self._props = None
+        self._anchor_us = 0
+        self._anchor_t = 0.0
+        self._synced_at = 0.0
+
+    def _subscribe(self) -> bool:
+        """Make sure we're listening on the current connection."""
+        if not isinstance(self.transport, NativeTransport):
+            return False
+        conn = self.transport.connection()
+        if conn is self._conn:
+            return True
+        with self._subscribe_lock:
+            if conn is self._conn:  # another thread got there first
+                return True
+            if self._on_signal not in conn.signal_handlers:
+                conn.signal_handlers.append(self._on_signal)
+            for rule in _MATCH_RULES:
+                conn.call(BUS_NAME, BUS_PATH, BUS_NAME, "AddMatch", "s", (rule,))
+            try:
+                owner = conn.call(BUS_NAME, BUS_PATH, BUS_NAME, "GetNameOwner",
+                                  "s", (self.transport.dest,))[0]
+            except DBusError:
+                owner = None  # Spotify not running yet; NameOwnerChanged will tell us
+            with self._lock:
+                self._conn = conn
+                self._owner = owner
+                self._props = None
+        return True
+
+    def _position_at(self, now: float) -> int:
+        props = self._props
+        if props.get("PlaybackStatus") != "Playing":
+            return self._anchor_us
+        rate = props.get("Rate") or 1.0
+        position = self._anchor_us + int((now - self._anchor_t) * 1_000_000 * rate)
+        length = (props.get("Metadata") or {}).get("mpris:length") or 0
+        return min(position, length) if length else position
+
+    def _anchor(self, position_us: int, now: float):
+        self._anchor_us = int(position_us)
+        self._anchor_t = now
+
+    def _on_signal(self, msg: Message):
+        now = time.monotonic()
+        with self._lock:
+            self._version += 1
+            self._changed.notify_all()
+            if msg.member == "NameOwnerChanged":
+                self._owner = msg.body[2] or None
+                self._props = None  # Spotify restarted or quit
+                return
+            if msg.sender != self._owner:
+                return
+            self.counters["signals"] += 1
+            if self._props is None:
+                return  # cold - the next read polls anyway
+            if msg.member == "Seeked":
+                self._anchor(msg.body[0], now)
+            elif msg.member == "PropertiesChanged" and msg.body[0] == PLAYER_IFACE:
+                changed, invalidated = msg.body[1], msg.body[2]
+                if invalidated:
+                    self._props = None
+                    return
+                position = self._position_at(now)
+                old_track = (self._props.get("Metadata") or {}).get("mpris:trackid")
+                self._props.update(changed)
+                if "Metadata" in changed:
+                    self._track_version += 1
+                if "Position" in changed:
+                    position = changed["Position"]
+                elif "Metadata" in changed:
+                    if changed["Metadata"].get("mpris:trackid") != old_track:
+                        position = 0  # new track starts from the top
+                    else:
+                        # Same track sent again (e.g. re-opened, which restarts
+                        # it): where it is now isn't known, re-poll on next read
+                        self._synced_at = 0.0
+                self._anchor(position, now)
+
+    def state(self, fresh: bool = False) -> PlayerState:
+        """Current player state; polls only when the cache can't answer."""
+        try:
+            live = self._subscribe()
+        except MprisError:
+            live = False  # the poll below reports the real error
+        now = time.monotonic()
+        with self._lock:
+            if fresh:
+                reason = "forced"
+            elif not live:
+                reason = "no_signals"
+            elif self._props is None:
+                reason = "cold"
+            elif now - self._synced_at > self.max_age:
+                reason = "stale"
+            else:
+                self.counters["hits"] += 1
+                props = dict(self._props, Position=self._position_at(now))
+                return PlayerState.from_properties(props)
+            self.counters[reason] += 1
+            self.counters["polls"] += 1
+
+        props = self.transport.get_all()
+        now = time.monotonic()
+        with self._lock:
+            self._props = dict(props)
+            self._anchor(props.get("Position") or 0, now)
+            self._synced_at = now
+        return PlayerState.from_properties(props)
+
+    def track_version(self) -> int:
+        """Counts Metadata signals, i.e. tracks loaded (or re-loaded)."""
+        with self._lock:
+            return self._track_version
+
+    def wait_for(self, predicate, timeout: float, poll_interval: float = 0.05,
+                 track_after: int = None):
+        """
+        Block until predicate(state) is true or timeout runs out.
+
+        Wakes up on every signal; without signals it re-polls every
+        poll_interval. With track_after (a track_version()), only states
+        from after a later Metadata signal count, so the state from before
+        an OpenUri can't pass for its result (ignored without signals).
+        Returns the state that satisfied the predicate, or None on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                seen = self._version
+            state = self.state()
+            with self._lock:
+                loaded = (track_after is None or self._track_version > track_after
+                          or self._conn is None or self._conn.closed)
+            if loaded and predicate(state):
+                return state
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            with self._changed:
+                if self._version == seen:
+                    self._changed.wait(min(remaining, poll_interval))
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            reads = stats["hits"] + stats["polls"]
+            stats["hit_rate"] = stats["hits"] / reads if reads else 0.0
+            stats["subscribed"] = self._conn is not None and not self._conn.closed
+            return stats
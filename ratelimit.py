@@ -0,0 +1,103 @@
+"""
+Per-host rate limiting and retries for the web lookups (DuckDuckGo, LRCLIB).
+
+Hosts get a token bucket via set_rate(); anything that talks to the
+network calls acquire(url) first, which blocks until that host has a
+token. Hosts without a configured rate aren't limited, so the MCP's
+one-off lookups pay nothing unless someone sets a rate.
+"""
+
+import random
+import threading
+import time
+import urllib.parse
+
+
+class TokenBucket:
+    """`rate` requests per second on average, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+        self.acquired = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token (possibly going into debt). Returns how long to wait."""
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            self.acquired += 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += wait
+            return wait
+
+    def acquire(self) -> float:
+        """Block until a request may go out. Returns seconds waited."""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def set_rate(host: str, rate: float, burst: int = 1) -> TokenBucket:
+    """Limit requests to `host` (e.g. "lrclib.net") from this process."""
+    with _buckets_lock:
+        bucket = _buckets[host] = TokenBucket(rate, burst)
+    return bucket
+
+
+def bucket_for(url: str):
+    return _buckets.get(urllib.parse.urlsplit(url).hostname or "")
+
+
+def acquire(url: str) -> float:
+    """Wait for the host of `url`, if it has a rate. Returns seconds waited."""
+    bucket = bucket_for(url)
+    return bucket.acquire() if bucket else 0.0
+
+
+def stats() -> dict:
+    """host -> {requests, waited} for every limited host."""
+    with _buckets_lock:
+        return {host: {"requests": b.acquired, "waited": b.waited} for host, b in _buckets.items()}
+
+
+class Retrying:
+    """
+    Call a function, retrying on `retry_on` with exponential backoff + jitter.
+
+    One instance per kind of call, so its counters say how flaky that
+    service has been.
+    """
+
+    def __init__(self, attempts: int = 4, base_delay: float = 0.5, max_delay: float = 8.0,
+                 retry_on=(OSError,)):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.retries = 0
+        self.failures = 0
+
+    def __call__(self, fn, *args):
+        for attempt in range(self.attempts):
+            try:
+                return fn(*args)
+            except self.retry_on:
+                if attempt == self.attempts - 1:
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
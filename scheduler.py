@@ -0,0 +1,105 @@
+"""
+Timed player events (stop a snippet, start the next clip...) on one thread.
+
+Every event lives in a heap ordered by monotonic deadline and a single
+worker fires them in order. Events carry a group so a new snippet can
+cancel whatever the previous one left behind.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class ScheduledEvent:
+    """A pending action. Call cancel() to drop it."""
+
+    __slots__ = ("when", "seq", "action", "label", "group", "cancelled", "on_cancel")
+
+    def __init__(self, when: float, seq: int, action, label: str, group, on_cancel=None):
+        self.when = when
+        self.seq = seq
+        self.action = action
+        self.label = label
+        self.group = group
+        self.cancelled = False
+        self.on_cancel = on_cancel
+
+    def __lt__(self, other: "ScheduledEvent") -> bool:
+        return (self.when, self.seq) < (other.when, other.seq)
+
+    def cancel(self):
+        if not self.cancelled:
+            self.cancelled = True
+            if self.on_cancel:
+                self.on_cancel()
+
+
+class Scheduler:
+    """A heap of ScheduledEvents and the one thread that fires them."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.fired = 0
+        self.cancelled = 0
+        self.errors = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def at(self, when: float, action, label: str = "", group=None,
+           on_cancel=None) -> ScheduledEvent:
+        """Run action() at monotonic time `when` (on_cancel() instead if it's cancelled)."""
+        event = ScheduledEvent(when, next(self._seq), action, label, group, on_cancel)
+        with self._cond:
+            heapq.heappush(self._heap, event)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="dj-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return event
+
+    def after(self, delay: float, action, label: str = "", group=None) -> ScheduledEvent:
+        """Run action() `delay` seconds from now."""
+        return self.at(self.clock() + delay, action, label, group)
+
+    def cancel_group(self, group) -> int:
+        """Cancel every pending event in `group`. Returns how many."""
+        count = 0
+        with self._cond:
+            for event in self._heap:
+                if event.group == group and not event.cancelled:
+                    event.cancel()
+                    count += 1
+            self.cancelled += count
+            self._cond.notify()
+        return count
+
+    def pending(self) -> list:
+        """[(seconds_from_now, label, group)] in firing order."""
+        now = self.clock()
+        with self._cond:
+            events = sorted(e for e in self._heap if not e.cancelled)
+        return [(e.when - now, e.label, e.group) for e in events]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    while self._heap and self._heap[0].cancelled:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    delay = self._heap[0].when - self.clock()
+                    if delay <= 0:
+                        event = heapq.heappop(self._heap)
+                        break
+                    self._cond.wait(delay)
+            try:
+                event.action()
+                self.fired += 1
+            except Exception:
+                self.errors += 1
@@ -0,0 +1,180 @@
+"""
+Spotify URI search (DuckDuckGo), behind a cache shared by the MCP and
+build_words_v2.
+
+Both dj_search("Daft Punk Digital Love") and the build's lookup for
+("Daft Punk", "Digital Love") are keyed by the normalized query, so a
+song found by either is free for the other. The cache lives in
+uri_cache.json + uri_cache.journal (see storage.JournaledDict). Entries
+hold the URI and when it was looked up; "no match" answers are cached
+for a shorter time and network errors not at all. Concurrent lookups of
+the same query share one request.
+"""
+
+import re
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future
+from pathlib import Path
+
+from httppool import get_client
+from lyrics import DAY, normalize
+from storage import JournaledDict
+
+URI_CACHE_FILE = Path(__file__).parent / "uri_cache.json"
+URI_CACHE_JOURNAL_FILE = Path(__file__).parent / "uri_cache.journal"
+SEARCH_HOST = "html.duckduckgo.com"
+
+_TRACK_LINK = re.compile(r'open\.spotify\.com/track/([a-zA-Z0-9]+)')
+
+
+def lookup_uri(query: str, timeout: float = 10):
+    """
+    Search for a Spotify URI via DuckDuckGo. None if there's no match.
+
+    Raises OSError if DuckDuckGo can't be reached.
+    """
+    url = f"https://{SEARCH_HOST}/html/?q={urllib.parse.quote(f'{query} spotify track')}"
+    response = get_client().get(url, headers={
+        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36'
+    }, timeout=timeout)
+    response.raise_for_status()
+    matches = _TRACK_LINK.findall(response.text())
+    return f"spotify:track:{matches[0]}" if matches else None
+
+
+def song_query(artist: str, track: str) -> str:
+    return f"{artist} {track}"
+
+
+class UriCache:
+    """
+    normalized query -> [uri or None, looked up at], persisted as a
+    JournaledDict.
+
+    uri_cache.json files from before this hold "artist|track": uri; those
+    entries are still used (under their normalized query) and don't
+    expire, and are replaced as their songs are looked up again.
+    """
+
+    def __init__(self, path: Path = URI_CACHE_FILE, journal_path: Path = URI_CACHE_JOURNAL_FILE,
+                 ttl: float = 90 * DAY, negative_ttl: float = DAY):
+        self.store = JournaledDict(path, journal_path)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.counters = {"hits": 0, "negative_hits": 0, "misses": 0, "expired": 0,
+                         "lookups": 0, "coalesced": 0, "errors": 0}
+        self._legacy = {}
+        for key, value in self.store.items():
+            if not isinstance(value, list):
+                self._legacy[normalize(key.replace("|", " "))] = value
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query: str) -> str:
+        return normalize(query)
+
+    def _lookup_cached(self, key: str, stale: bool = False):
+        """(found, uri) from the store, counting nothing."""
+        entry = self.store.get(key)
+        if entry is not None:
+            uri, fetched = entry
+            ttl = self.ttl if uri is not None else self.negative_ttl
+            if stale or time.time() - fetched <= ttl:
+                return True, uri
+            return False, None
+        if key in self._legacy:
+            return True, self._legacy[key]
+        return False, None
+
+    def get(self, query: str):
+        """(found, uri); uri is None for a cached "no match"."""
+        key = self.key(query)
+        found, uri = self._lookup_cached(key)
+        with self._lock:
+            if found:
+                self.counters["hits"] += 1
+                if uri is None:
+                    self.counters["negative_hits"] += 1
+            else:
+                self.counters["misses"] += 1
+                if key in self.store:
+                    self.counters["expired"] += 1
+        return found, uri
+
+    def peek(self, query: str, default=None):
+        """The cached URI even if it has expired; `default` if there's none."""
+        found, uri = self._lookup_cached(self.key(query), stale=True)
+        return uri if found else default
+
+    def put(self, query: str, uri):
+        self.store[self.key(query)] = [uri, time.time()]
+
+    def resolve(self, query: str, lookup=lookup_uri, offline: bool = False):
+        """
+        The URI for a query: cached, else lookup(query) (None for no match).
+
+        If another thread is already looking up the same query this waits
+        for its answer instead of sending a second request. Exceptions from
+        lookup are passed to every waiter and not cached. With offline,
+        expired entries are used and nothing is looked up.
+        """
+        found, uri = self.get(query)
+        if found:
+            return uri
+        if offline:
+            return self.peek(query)
+        key = self.key(query)
+        with self._lock:
+            found, uri = self._lookup_cached(key)
+            if found:  # someone else just finished it
+                return uri
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.counters["lookups"] += 1
+            else:
+                self.counters["coalesced"] += 1
+        if not owner:
+            return future.result()
+        try:
+            uri = lookup(query)
+        except BaseException as e:
+            with self._lock:
+                self.counters["errors"] += 1
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        self.put(query, uri)
+        with self._lock:
+            del self._inflight[key]
+        future.set_result(uri)
+        return uri
+
+    def compact(self):
+        self.store.compact()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+        stats["entries"] = len(self.store)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> UriCache:
+    """The process-wide URI cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = UriCache()
+    return _cache
+
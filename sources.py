@@ -0,0 +1,187 @@
+"""
+Where build_words_v2 gets its song list.
+
+A source is one of:
+- "builtin": the SONGS list in build_words_v2.py
+- a .csv file: artist,track[,uri] columns (header optional), or an
+  Exportify playlist export ("Artist Name(s)", "Track Name", "Track URI")
+- a .jsonl file: one {"artist": ..., "track": ..., "uri": ...} per line
+- a .json Spotify data export (Playlist1.json, YourLibrary.json)
+- a .m3u / .m3u8 playlist (#EXTINF:<secs>,Artist - Title)
+- a directory of .lrc files: lyrics come from the files, no LRCLIB.
+  Artist/title come from the [ar:] / [ti:] tags, else "Artist - Title.lrc".
+  An optional [uri:spotify:track:...] tag saves the URI lookup.
+
+iter_songs() chains sources and drops duplicates, comparing artist and
+track case-, accent- and whitespace-insensitively.
+"""
+
+import csv
+import json
+import re
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from lyrics import normalize, parse_synced
+
+
+class Song(NamedTuple):
+    artist: str
+    track: str
+    uri: Optional[str] = None
+    lrc_path: Optional[str] = None  # local lyrics, instead of LRCLIB
+
+
+def _song(artist, track, uri=None, lrc_path=None):
+    artist, track = (artist or "").strip(), (track or "").strip()
+    if not artist or not track:
+        return None
+    return Song(artist, track, (uri or "").strip() or None, lrc_path)
+
+
+# ============ FILE FORMATS ============
+
+_CSV_COLUMNS = {
+    "artist": ("artist", "artist name", "artist name(s)", "artists", "artistname"),
+    "track": ("track", "track name", "title", "name", "song", "trackname"),
+    "uri": ("uri", "track uri", "spotify uri", "trackuri"),
+}
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = csv.reader(f)
+        header = next(rows, None)
+        if header is None:
+            return
+        lowered = [h.strip().lower() for h in header]
+        columns = {}
+        for field, names in _CSV_COLUMNS.items():
+            columns[field] = next((lowered.index(n) for n in names if n in lowered), None)
+        # Exportify joins multiple artists with commas; the first is what
+        # LRCLIB and search know the song by. Elsewhere a comma is part of
+        # the name ("Earth, Wind & Fire")
+        several_artists = columns["artist"] is not None \
+            and lowered[columns["artist"]] == "artist name(s)"
+        if columns["artist"] is None or columns["track"] is None:
+            # No recognisable header: artist, track[, uri]
+            columns = {"artist": 0, "track": 1, "uri": 2}
+            rows = [header, *rows]
+            several_artists = False
+
+        def cell(row, field):
+            i = columns[field]
+            return row[i] if i is not None and i < len(row) else None
+
+        for row in rows:
+            artist = cell(row, "artist") or ""
+            if several_artists:
+                artist = artist.split(",")[0]
+            song = _song(artist, cell(row, "track"), cell(row, "uri"))
+            if song:
+                yield song
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                song = _song(item.get("artist"), item.get("track"), item.get("uri"))
+                if song:
+                    yield song
+
+
+def read_spotify_export(path):
+    """Spotify's account data export: playlists and saved tracks."""
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    items = []
+    for playlist in data.get("playlists", ()):
+        items += [item.get("track") or {} for item in playlist.get("items", ())]
+    items += data.get("tracks", ())
+    for item in items:
+        song = _song(item.get("artistName") or item.get("artist"),
+                     item.get("trackName") or item.get("track"),
+                     item.get("trackUri") or item.get("uri"))
+        if song:
+            yield song
+
+
+def read_m3u(path):
+    with open(path, encoding="utf-8-sig") as f:
+        for line in f:
+            if line.startswith("#EXTINF:") and "," in line:
+                title = line.split(",", 1)[1].strip()
+                if " - " in title:
+                    song = _song(*title.split(" - ", 1))
+                    if song:
+                        yield song
+
+
+_LRC_TAG = re.compile(r"^\[(ar|ti|uri):(.*)\]\s*$")
+
+
+def read_lrc(path) -> tuple:
+    """({tag: value}, [(seconds, text, word_times)]) for a .lrc file (see lyrics.parse_synced)."""
+    text = Path(path).read_text(encoding="utf-8-sig", errors="replace")
+    tags = {}
+    for line in text.splitlines():
+        match = _LRC_TAG.match(line.strip())
+        if match:
+            tags[match.group(1)] = match.group(2).strip()
+    return tags, parse_synced(text)
+
+
+def read_lrc_dir(path):
+    for lrc in sorted(Path(path).rglob("*.lrc")):
+        tags = {}
+        with open(lrc, encoding="utf-8-sig", errors="replace") as f:
+            # Tags are at the top; don't read whole files just for the list
+            for _, line in zip(range(20), f):
+                match = _LRC_TAG.match(line.strip())
+                if match:
+                    tags[match.group(1)] = match.group(2).strip()
+        artist, track = tags.get("ar"), tags.get("ti")
+        if not (artist and track) and " - " in lrc.stem:
+            artist, track = lrc.stem.split(" - ", 1)
+        song = _song(artist, track, tags.get("uri"), str(lrc))
+        if song:
+            yield song
+
+
+# ============ SOURCES ============
+
+def open_source(spec: str, builtin=()):
+    """Songs from one source spec (see module docstring)."""
+    if spec == "builtin":
+        return (_song(artist, track) for artist, track in builtin)
+    path = Path(spec)
+    if path.is_dir():
+        return read_lrc_dir(path)
+    readers = {".csv": read_csv, ".jsonl": read_jsonl, ".json": read_spotify_export,
+               ".m3u": read_m3u, ".m3u8": read_m3u}
+    reader = readers.get(path.suffix.lower())
+    if reader is None:
+        raise ValueError(f"don't know how to read songs from {spec}")
+    return reader(path)
+
+
+def song_identity(artist: str, track: str) -> tuple:
+    return normalize(artist), normalize(track)
+
+
+def iter_songs(specs, builtin=(), skipped: list = None):
+    """
+    Songs from every source, first listing wins. Duplicates are appended
+    to `skipped` if given.
+    """
+    seen = set()
+    for spec in specs:
+        for song in open_source(spec, builtin):
+            identity = song_identity(song.artist, song.track)
+            if identity in seen:
+                if skipped is not None:
+                    skipped.append(song)
+                continue
+            seen.add(identity)
+            yield song
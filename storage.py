@@ -0,0 +1,194 @@
+"""
+Crash-safe files for the build and the caches.
+
+- atomic_write / atomic_open: write a temp file next to the target and
+  rename it into place, so readers (and a crash) only ever see the old
+  file or the new one, never half of each.
+- JournaledDict: a JSON snapshot plus an append-only journal of updates.
+  Each update is one appended line instead of rewriting the whole file;
+  the journal is folded back into the snapshot every so often.
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# The process umask, for giving new files the mode open() would have.
+# Reading it means setting it, so that happens once, at import.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextmanager
+def atomic_open(path, mode: str = "w", **kwargs):
+    """Like open(path, mode), but the file only appears once the block exits cleanly."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        # mkstemp files are 0600; keep the replaced file's mode instead
+        try:
+            file_mode = path.stat().st_mode & 0o7777
+        except OSError:
+            file_mode = 0o666 & ~_UMASK
+        os.fchmod(fd, file_mode)
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write(path, data):
+    """Replace path with data (str or bytes) atomically."""
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with atomic_open(path, mode) as f:
+        f.write(data)
+
+
+class JournaledDict:
+    """
+    A str -> JSON-value mapping persisted as snapshot + journal.
+
+    snapshot is plain JSON (what uri_cache.json always was); journal has
+    one [key, value] line per update since the last compaction. Loading
+    replays the journal over the snapshot, ignoring a torn last line.
+    Replaying twice is harmless, so a crash between writing the snapshot
+    and truncating the journal loses nothing.
+
+    Several processes (the MCP and a build) can share the files. Appends
+    and compactions take a lock file (<snapshot>.lock); compacting folds
+    in what is on disk, other processes' updates included, rather than
+    writing out this process's copy, and an append after someone else's
+    compaction goes to the new journal.
+    """
+
+    def __init__(self, path, journal_path=None, compact_every: int = 500):
+        self.path = Path(path)
+        self.journal_path = Path(journal_path) if journal_path else self.path.with_suffix(".journal")
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.compact_every = compact_every
+        self._data = {}
+        self._journal = None
+        self._lock_file = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        with self._lock, self._locked():
+            self._data, self._pending = self._read()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the lock file (against other processes; callers hold _lock)."""
+        if self._lock_file is None:
+            self._lock_file = open(self.lock_path, "a")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _read(self):
+        """(snapshot + journal as on disk, journal lines). Needs the lock file."""
+        data = {}
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+        lines = 0
+        try:
+            with open(self.journal_path, "rb+") as f:
+                good = 0
+                for line in f:
+                    try:
+                        key, value = json.loads(line)
+                    except ValueError:
+                        # Torn write at the end of a crashed run: cut it off
+                        # so the next append starts on a clean line
+                        f.truncate(good)
+                        break
+                    data[key] = value
+                    lines += 1
+                    good += len(line)
+        except FileNotFoundError:
+            pass
+        return data, lines
+
+    def _journal_file(self):
+        """Our append handle, reopened if another process compacted the journal away."""
+        if self._journal is not None:
+            try:
+                current = os.stat(self.journal_path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current != os.fstat(self._journal.fileno()).st_ino:
+                self._journal.close()
+                self._journal = None
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a")
+        return self._journal
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(list(self._data))
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            if key in self._data and self._data[key] == value:
+                return
+            self._data[key] = value
+            with self._locked():
+                journal = self._journal_file()
+                journal.write(json.dumps([key, value]) + "\n")
+                journal.flush()
+                self._pending += 1
+                if self._pending >= self.compact_every:
+                    self._compact()
+
+    def compact(self):
+        """Fold the journal into the snapshot."""
+        with self._lock, self._locked():
+            self._compact()
+
+    def _compact(self):
+        """Needs _lock and the lock file."""
+        data, lines = self._read()
+        if not lines and self.path.exists():
+            self._pending = 0
+            return
+        # What's on disk has every process's updates, ours included
+        # (each one was journaled before it counted)
+        atomic_write(self.path, json.dumps(data, indent=2))
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        try:
+            os.unlink(self.journal_path)
+        except FileNotFoundError:
+            pass
+        self._data = data
+        self._pending = 0
+
+    def close(self):
+        self.compact()
@@ -0,0 +1,149 @@
+"""
+"Did you mean...?" lookups over a set of keys (indexed words, library names).
+
+Built once per key set:
+- a sorted key list, bisected for prefix matches
+- a bigram/trigram inverted index for substring matches
+- trigram overlap (bucketed by key length) + bounded edit distance for typos
+
+so suggestions stay fast as the word index grows, instead of scanning
+every key per miss.
+"""
+
+import array
+import bisect
+from collections import Counter
+
+
+def _grams(text: str, n: int) -> set:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Levenshtein distance, or limit + 1 once it's known to be over limit.
+
+    Only the diagonal band |i - j| <= limit is computed, so this is
+    O(len * limit) rather than O(len^2).
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    prev = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        cur = [over] * (len(b) + 1)
+        cur[0] = i if i <= limit else over
+        ca = a[i - 1]
+        for j in range(lo, hi + 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != b[j - 1]), over)
+        if min(cur[lo - 1:hi + 1]) > limit:
+            return over
+        prev = cur
+    return prev[-1]
+
+
+class SuggestIndex:
+    """
+    Prefix, substring and typo-tolerant lookups over a fixed set of keys.
+
+    weights (optional, key -> number) break ties in favour of "bigger" keys,
+    e.g. words with more variants.
+    """
+
+    def __init__(self, keys, weights: dict = None):
+        self.keys = sorted(set(keys))
+        self.weights = weights or {}
+        self._grams = {}
+        # (trigram, key length) -> ids, so typo lookups only touch keys of
+        # a plausible length
+        self._sized = {}
+        for i, key in enumerate(self.keys):
+            trigrams = _grams(key, 3)
+            for gram in _grams(key, 2) | trigrams:
+                ids = self._grams.get(gram)
+                if ids is None:
+                    ids = self._grams[gram] = array.array("I")
+                ids.append(i)
+            for gram in trigrams:
+                ids = self._sized.get((gram, len(key)))
+                if ids is None:
+                    ids = self._sized[(gram, len(key))] = array.array("I")
+                ids.append(i)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def prefixed(self, prefix: str, limit: int = None) -> list:
+        """Keys starting with prefix, alphabetically."""
+        i = bisect.bisect_left(self.keys, prefix)
+        out = []
+        while i < len(self.keys) and self.keys[i].startswith(prefix):
+            out.append(self.keys[i])
+            if limit and len(out) >= limit:
+                break
+            i += 1
+        return out
+
+    def _candidates(self, text: str):
+        """Key ids that contain every n-gram of text (None = can't narrow down)."""
+        n = 3 if len(text) >= 3 else 2
+        grams = _grams(text, n)
+        if not grams or len(text) < 2:
+            return None
+        lists = sorted((self._grams.get(g, ()) for g in grams), key=len)
+        ids = set(lists[0])
+        for other in lists[1:]:
+            if not ids:
+                break
+            ids.intersection_update(other)
+        return ids
+
+    def containing(self, text: str) -> list:
+        """Keys containing text, best first (earlier position, then shorter)."""
+        ids = self._candidates(text)
+        keys = self.keys if ids is None else (self.keys[i] for i in ids)
+        matches = [k for k in keys if text in k]
+        matches.sort(key=lambda k: (k.find(text), len(k), -self.weights.get(k, 0), k))
+        return matches
+
+    def similar(self, text: str, limit: int = 5, max_distance: int = 2) -> list:
+        """Keys within max_distance edits of text, closest first."""
+        overlap = Counter()
+        lengths = range(max(len(text) - max_distance, 1), len(text) + max_distance + 1)
+        for gram in _grams(text, 3):
+            for length in lengths:
+                overlap.update(self._sized.get((gram, length), ()))
+        # If nothing shares a trigram (very short text), fall back to bigrams
+        if not overlap:
+            for gram in _grams(text, 2):
+                overlap.update(i for i in self._grams.get(gram, ())
+                               if len(self.keys[i]) in lengths)
+        # q-gram lemma: each edit destroys at most 3 trigrams, so anything
+        # sharing fewer can't be within max_distance
+        needed = len(text) - 2 - 3 * max_distance
+        scored = []
+        for i, shared in overlap.most_common(30):
+            if shared < needed:
+                break
+            key = self.keys[i]
+            distance = edit_distance(text, key, max_distance)
+            if distance <= max_distance:
+                scored.append((distance, -self.weights.get(key, 0), key))
+        scored.sort()
+        return [key for _, _, key in scored[:limit]]
+
+    def suggest(self, text: str, limit: int = 5) -> list:
+        """Ranked suggestions: prefix matches, then substrings, then typos."""
+        out = []
+        prefixed = self.prefixed(text, 50)
+        prefixed.sort(key=lambda k: (len(k), -self.weights.get(k, 0), k))
+        groups = (lambda: prefixed, lambda: self.containing(text),
+                  lambda: self.similar(text, limit))
+        for group in groups:
+            for key in group():
+                if key != text and key not in out:
+                    out.append(key)
+                if len(out) >= limit:
+                    return out
+        return out
@@ -0,0 +1,144 @@
+"""
+Lyrics cache tests, against a local stand-in for LRCLIB (no network).
+
+    python3 -m pytest test_lyrics.py      # or: python3 -m unittest test_lyrics
+"""
+
+import json
+import tempfile
+import threading
+import unittest
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+import lyrics
+from lyrics import DAY, LyricsCache, LyricsUnavailable, get_synced_lyrics
+
+SONG = "[00:01.00]Hello there\n[00:03.50]General Kenobi\n"
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """LRCLIB's /api/get: `songs` maps track name -> (status, synced lyrics)."""
+
+    protocol_version = "HTTP/1.1"
+    songs = {}
+    requests = []
+
+    def do_GET(self):
+        query = dict(urllib.parse.parse_qsl(self.path.partition("?")[2]))
+        self.requests.append(query.get("track_name"))
+        status, synced = self.songs.get(query.get("track_name"), (404, None))
+        body = json.dumps({"syncedLyrics": synced} if status == 200 else {"code": status}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LyricsCacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name)
+        StandIn.songs = {"Song": (200, SONG), "Instrumental": (200, None)}
+        StandIn.requests = []
+        url = f"http://127.0.0.1:{self.server.server_port}"
+        self.use_cache(LyricsCache(self.directory))
+        patcher = mock.patch.object(lyrics, "LRCLIB_URL", url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def use_cache(self, cache: LyricsCache) -> LyricsCache:
+        patcher = mock.patch.object(lyrics, "_cache", cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return cache
+
+    def test_miss_then_hit(self):
+        lines = get_synced_lyrics("Artist", "Song")
+        self.assertEqual([(1.0, "Hello there", None), (3.5, "General Kenobi", None)], lines)
+        self.assertEqual(lines, get_synced_lyrics("artist", "  SONG "))
+        self.assertEqual(["Song"], StandIn.requests)
+        stats = lyrics.get_cache().stats()
+        self.assertEqual((1, 1), (stats["misses"], stats["memory_hits"]))
+
+    def test_hit_from_disk(self):
+        get_synced_lyrics("Artist", "Song")
+        cache = self.use_cache(LyricsCache(self.directory))
+        self.assertEqual(2, len(get_synced_lyrics("Artist", "Song")))
+        self.assertEqual(1, len(StandIn.requests))
+        self.assertEqual(1, cache.stats()["disk_hits"])
+
+    def test_no_lyrics_is_cached(self):
+        for track in ("Instrumental", "Unknown"):  # no synced lyrics / 404
+            self.assertEqual([], get_synced_lyrics("Artist", track))
+            self.assertEqual([], get_synced_lyrics("Artist", track))
+        self.assertEqual(["Instrumental", "Unknown"], StandIn.requests)
+        self.assertEqual(2, lyrics.get_cache().stats()["negative_hits"])
+
+    def test_entries_expire(self):
+        get_synced_lyrics("Artist", "Song")
+        get_synced_lyrics("Artist", "Instrumental")
+        later = lyrics.time.time() + 2 * DAY
+        with mock.patch.object(lyrics.time, "time", return_value=later):
+            # "No lyrics" is asked again after a day, lyrics are kept for 30
+            get_synced_lyrics("Artist", "Song")
+            get_synced_lyrics("Artist", "Instrumental")
+        self.assertEqual(["Song", "Instrumental", "Instrumental"], StandIn.requests)
+        self.assertEqual(1, lyrics.get_cache().stats()["expired"])
+
+    def test_memory_lru(self):
+        cache = self.use_cache(LyricsCache(self.directory, memory_entries=2))
+        for track in ("A", "B", "A", "C"):
+            cache.put("Artist", track, [(1.0, track, None)])
+        cache.get("Artist", "A")
+        cache.get("Artist", "B")  # dropped from memory, still on disk
+        stats = cache.stats()
+        self.assertEqual((1, 1, 2), (stats["memory_hits"], stats["disk_hits"],
+                                     stats["memory_entries"]))
+
+    def test_disk_eviction(self):
+        cache = self.use_cache(LyricsCache(self.directory, max_bytes=1000))
+        for i in range(20):
+            cache.put("Artist", f"Track {i}", [(1.0, "x" * 50, None)])
+        stats = cache.stats()
+        self.assertGreater(stats["evictions"], 0)
+        self.assertLessEqual(stats["disk_bytes"], 1000)
+        self.assertEqual(stats["disk_entries"], len(list(self.directory.glob("*/*.json"))))
+        self.assertEqual((True, [(1.0, "x" * 50, None)]), cache.get("Artist", "Track 19"))
+
+    def test_errors_are_not_cached(self):
+        StandIn.songs["Song"] = (500, None)
+        with self.assertRaises(LyricsUnavailable):
+            get_synced_lyrics("Artist", "Song")
+        self.assertEqual((False, None), lyrics.get_cache().get("Artist", "Song"))
+        StandIn.songs["Song"] = (200, SONG)
+        self.assertEqual(2, len(get_synced_lyrics("Artist", "Song")))
+        self.assertEqual(["Song", "Song"], StandIn.requests)
+
+    def test_unreachable_is_not_cached(self):
+        with mock.patch.object(lyrics, "LRCLIB_URL", "http://127.0.0.1:1"):
+            with self.assertRaises(LyricsUnavailable):
+                get_synced_lyrics("Artist", "Song")
+            self.assertEqual([], lyrics.fetch_synced_lyrics("Artist", "Song"))
+        self.assertEqual(2, len(get_synced_lyrics("Artist", "Song")))
+
+
+if __name__ == "__main__":
+    unittest.main()
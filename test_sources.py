@@ -0,0 +1,39 @@
+"""
+Song list source tests.
+
+    python3 -m pytest test_sources.py     # or: python3 -m unittest test_sources
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from sources import Song, read_csv
+
+
+class ReadCsvTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name)
+
+    def read(self, text: str) -> list:
+        path = self.directory / "songs.csv"
+        path.write_text(text, encoding="utf-8")
+        return list(read_csv(path))
+
+    def test_artist_with_comma_is_kept_whole(self):
+        songs = [Song("Earth, Wind & Fire", "September", "spotify:track:1")]
+        self.assertEqual(songs, self.read(
+            'artist,track,uri\n"Earth, Wind & Fire",September,spotify:track:1\n'))
+        self.assertEqual(songs, self.read(  # no header
+            '"Earth, Wind & Fire",September,spotify:track:1\n'))
+
+    def test_exportify_takes_first_artist(self):
+        self.assertEqual([Song("Daft Punk", "Get Lucky", "spotify:track:2")], self.read(
+            'Track URI,Track Name,Artist Name(s)\n'
+            'spotify:track:2,Get Lucky,"Daft Punk,Pharrell Williams,Nile Rodgers"\n'))
+
+
+if __name__ == "__main__":
+    unittest.main()
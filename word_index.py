@@ -0,0 +1,543 @@
+"""
+The word index, kept resident in memory.
+
+Loaded on first use, then only reloaded when the file's mtime or size
+changes, so dj_say / dj_word_info don't re-parse the whole thing per call.
+
+Two on-disk formats:
+- words.json: what build_words_v2 has always written. Every posting repeats
+  artist/track/uri/line, so it's big on disk and bigger in memory.
+- words.idx: compact columnar version. Strings are stored once, tracks and
+  lines are tables, postings are parallel integer arrays. It's memory-mapped
+  and only the postings for the word you ask for are ever decoded.
+
+    python3 word_index.py convert words.json words.idx
+"""
+
+import array
+import heapq
+import itertools
+import json
+import mmap
+import operator
+import pickle
+import struct
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from storage import atomic_open
+from suggest import SuggestIndex
+
+MAGIC = b"DJWI"
+# v2 added the per-posting word offset within its line, v3 its score
+VERSION = 3
+# p_score for entries that have none (indexes built before scores)
+NO_SCORE = 0xFFFF
+# magic, version, n_strings, blob_len, n_tracks, n_lines, n_words, n_postings
+HEADER = struct.Struct("<4sIIIIIII")
+
+
+def deep_sizeof(obj, seen: set = None) -> int:
+    """Rough memory footprint of a JSON-ish structure, shared objects counted once."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_sizeof(v, seen) for v in obj)
+    return size
+
+
+# ============ COMPACT FORMAT ============
+
+def _pad4(n: int) -> int:
+    return n + (-n % 4)
+
+
+def _le(arr: array.array) -> bytes:
+    """Array contents in little-endian byte order."""
+    if sys.byteorder == "big":
+        arr = array.array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+class CompactWriter:
+    """
+    Builds a words.idx one word at a time.
+
+    Words must be added in sorted order (by UTF-8 bytes, which is the same
+    as str order). Only the string table and the integer posting columns
+    are held in memory, not the entry dicts.
+    """
+
+    def __init__(self):
+        self.strings, self.string_ids = [], {}
+        self.tracks, self.track_ids = array.array("I"), {}
+        self.lines, self.line_ids = array.array("I"), {}
+        self.word_sids = array.array("I")
+        self.word_starts = array.array("I", [0])
+        self.p_track, self.p_line = array.array("I"), array.array("I")
+        self.p_time, self.p_dur = array.array("I"), array.array("H")
+        self.p_off, self.p_score = array.array("H"), array.array("H")
+
+    def _intern(self, text: str) -> int:
+        sid = self.string_ids.get(text)
+        if sid is None:
+            sid = self.string_ids[text] = len(self.strings)
+            self.strings.append(text.encode())
+        return sid
+
+    def add_word(self, word: str, entries):
+        """Append a word and its entries (in variant order)."""
+        self.word_sids.append(self._intern(word))
+        for entry in entries:
+            key = (entry["artist"], entry["track"], entry["uri"])
+            tid = self.track_ids.get(key)
+            if tid is None:
+                tid = self.track_ids[key] = len(self.track_ids)
+                self.tracks.extend(self._intern(part) for part in key)
+            lid = self.line_ids.get(entry["line"])
+            if lid is None:
+                lid = self.line_ids[entry["line"]] = len(self.lines)
+                self.lines.append(self._intern(entry["line"]))
+            self.p_track.append(tid)
+            self.p_line.append(lid)
+            self.p_time.append(int(round(entry["time"] * 100)))
+            self.p_dur.append(int(round(entry.get("duration", 1.5) * 100)))
+            self.p_off.append(int(round(entry.get("offset", 0) * 100)))
+            score = entry.get("score")
+            self.p_score.append(NO_SCORE if score is None else int(round(score * 1000)))
+        self.word_starts.append(len(self.p_track))
+
+    def write(self, path: Path):
+        """
+        Write everything added so far. Goes to a temp file that's renamed
+        into place, so readers that have the old file mapped are never
+        pulled out from under.
+        """
+        offsets = array.array("I", [0])
+        for data in self.strings:
+            offsets.append(offsets[-1] + len(data))
+        blob = b"".join(self.strings)
+
+        with atomic_open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(self.strings), len(blob), len(self.track_ids),
+                                len(self.lines), len(self.word_sids), len(self.p_track)))
+            f.write(_le(offsets))
+            f.write(blob + b"\0" * (_pad4(len(blob)) - len(blob)))
+            for arr in (self.tracks, self.lines, self.word_sids, self.word_starts,
+                        self.p_track, self.p_line, self.p_time, self.p_dur, self.p_off,
+                        self.p_score):
+                data = _le(arr)
+                f.write(data + b"\0" * (_pad4(len(data)) - len(data)))
+
+
+def write_compact(index: dict, path: Path):
+    """
+    Write a word -> [entry, ...] index in the compact format.
+
+    Entry order per word is preserved, so variant numbers stay the same.
+    """
+    writer = CompactWriter()
+    # Sort words by their UTF-8 bytes - that's what the reader bisects on
+    for word in sorted(index, key=lambda w: w.encode()):
+        writer.add_word(word, index[word])
+    writer.write(path)
+
+
+_order = operator.itemgetter(0, 1, 2)  # word, rank, seq
+
+
+def write_run(path: Path, postings: list):
+    """Sort (word, rank, seq, entry) postings and write them as one merge run."""
+    postings.sort(key=_order)
+    with open(path, "wb") as f:
+        for i in range(0, len(postings), 10_000):
+            pickle.dump(postings[i:i + 10_000], f, pickle.HIGHEST_PROTOCOL)
+
+
+_encode = json.JSONEncoder().encode
+# ensure_ascii output never contains a raw newline, so this separator can
+# only ever land between fields
+_encode_entry = json.JSONEncoder(separators=(",\n      ", ": ")).encode
+
+
+def _json_entries(entries: list) -> str:
+    """
+    json.dumps(entries, indent=2) as it appears one level into the index.
+
+    json's indent support is pure Python and was most of the build time;
+    entries are flat dicts, so the C encoder can do each one with the
+    indentation baked into its item separator.
+    """
+    if not entries:
+        return "[]"
+    items = []
+    for entry in entries:
+        encoded = _encode_entry(entry)
+        items.append("{\n      " + encoded[1:-1] + "\n    }" if entry else encoded)
+    return "[\n    " + ",\n    ".join(items) + "\n  ]"
+
+
+class IndexWriter:
+    """
+    Builds words.json and words.idx from postings added in any order,
+    without holding the whole index in memory.
+
+    Postings are buffered and spilled to sorted temp files (external sort)
+    every `buffer_size` postings, then merged word by word. Worker
+    processes can write runs of their own (write_run to run_path()). Each word's
+    entries come out ordered by (rank, order added) - pass the song's
+    position as rank and the output doesn't depend on which song finished
+    first.
+    """
+
+    def __init__(self, buffer_size: int = 200_000, tmp_dir=None):
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._runs = []
+        self._run_names = 0
+        self._seq = 0
+        self._tmp = tempfile.TemporaryDirectory(prefix="dj-index-", dir=tmp_dir)
+
+    def add(self, word: str, entry: dict, rank: int = 0):
+        self._buffer.append((word, rank, self._seq, entry))
+        self._seq += 1
+        if len(self._buffer) >= self.buffer_size:
+            self._spill()
+
+    def _spill(self):
+        path = self.run_path()
+        write_run(path, self._buffer)
+        self.add_run(path)
+        self._buffer = []
+
+    def run_path(self) -> Path:
+        """A fresh file name for a run (for add_run from another process)."""
+        path = Path(self._tmp.name) / f"run{self._run_names}.pickle"
+        self._run_names += 1
+        return path
+
+    def add_run(self, path: Path):
+        """Include a run written by write_run (e.g. by a worker process)."""
+        self._runs.append(path)
+
+    @staticmethod
+    def _read_run(path: Path):
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    yield from pickle.load(f)
+                except EOFError:
+                    return
+
+    def _merged(self):
+        """(word, [entries]) in word order."""
+        self._buffer.sort(key=_order)
+        runs = [self._read_run(path) for path in self._runs] + [iter(self._buffer)]
+        stream = heapq.merge(*runs, key=_order) if len(runs) > 1 else runs[0]
+        for word, group in itertools.groupby(stream, key=lambda p: p[0]):
+            yield word, [p[3] for p in group]
+
+    def finish(self, json_path: Path, idx_path: Path = None) -> dict:
+        """
+        Write words.json (same bytes as json.dump(index, f, indent=2) of
+        the sorted index) and optionally words.idx. Returns counts.
+        """
+        compact = CompactWriter() if idx_path else None
+        words = entries = 0
+        try:
+            with atomic_open(json_path, "w") as f:
+                f.write("{")
+                for word, group in self._merged():
+                    f.write(",\n  " if words else "\n  ")
+                    f.write(_encode(word) + ": " + _json_entries(group))
+                    if compact:
+                        compact.add_word(word, group)
+                    words += 1
+                    entries += len(group)
+                f.write("\n}" if words else "}")
+            if compact:
+                compact.write(idx_path)
+        finally:
+            self._tmp.cleanup()
+        return {"words": words, "entries": entries, "runs": len(self._runs)}
+
+
+def convert_json(json_path: Path, idx_path: Path) -> dict:
+    """words.json -> words.idx. Returns sizes for the curious."""
+    index = json.loads(Path(json_path).read_text())
+    write_compact(index, idx_path)
+    return {"words": len(index), "json_bytes": Path(json_path).stat().st_size,
+            "idx_bytes": Path(idx_path).stat().st_size}
+
+
+class CompactIndex:
+    """
+    Read-only, memory-mapped words.idx.
+
+    Quacks like the words.json dict (index[word], word in index, keys(),
+    len) but only decodes the postings of the word being looked up.
+    """
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_strings, blob_len, n_tracks, n_lines, n_words, n_postings = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version not in (1, 2, VERSION):
+            raise ValueError(f"{path} is not a v{VERSION} word index")
+        self._version = version
+        self._n_words = n_words
+        self._n_postings = n_postings
+
+        view = memoryview(self._mm)
+        pos = HEADER.size
+
+        def take(count: int, typecode: str):
+            nonlocal pos
+            size = count * array.array(typecode).itemsize
+            section = view[pos:pos + size]
+            pos = _pad4(pos + size)
+            if sys.byteorder == "big":
+                arr = array.array(typecode, section.tobytes())
+                arr.byteswap()
+                return arr
+            return section.cast(typecode)
+
+        self._str_offsets = take(n_strings + 1, "I")
+        self._blob = view[pos:pos + blob_len]
+        pos = _pad4(pos + blob_len)
+        self._tracks = take(n_tracks * 3, "I")
+        self._lines = take(n_lines, "I")
+        self._words = take(n_words, "I")
+        self._word_starts = take(n_words + 1, "I")
+        self._p_track = take(n_postings, "I")
+        self._p_line = take(n_postings, "I")
+        self._p_time = take(n_postings, "I")
+        self._p_dur = take(n_postings, "H")
+        self._p_off = take(n_postings, "H") if version >= 2 else None
+        self._p_score = take(n_postings, "H") if version >= 3 else None
+
+    def _bytes(self, sid: int) -> bytes:
+        return self._blob[self._str_offsets[sid]:self._str_offsets[sid + 1]].tobytes()
+
+    def _str(self, sid: int) -> str:
+        return self._bytes(sid).decode()
+
+    def _find(self, word: str) -> int:
+        """Position of word in the sorted word table, or -1."""
+        key = word.encode()
+        lo, hi = 0, self._n_words
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(self._words[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n_words and self._bytes(self._words[lo]) == key:
+            return lo
+        return -1
+
+    def _entry(self, p: int) -> dict:
+        t = self._p_track[p] * 3
+        entry = {
+            "artist": self._str(self._tracks[t]),
+            "track": self._str(self._tracks[t + 1]),
+            "uri": self._str(self._tracks[t + 2]),
+            "time": self._p_time[p] / 100,
+            "line": self._str(self._lines[self._p_line[p]]),
+            "duration": self._p_dur[p] / 100,
+        }
+        if self._p_off is not None:
+            entry["offset"] = self._p_off[p] / 100
+        if self._p_score is not None and self._p_score[p] != NO_SCORE:
+            entry["score"] = self._p_score[p] / 1000
+        return entry
+
+    def get(self, word: str, default=None):
+        i = self._find(word)
+        if i < 0:
+            return default
+        return [self._entry(p) for p in range(self._word_starts[i], self._word_starts[i + 1])]
+
+    def __getitem__(self, word: str) -> list:
+        entries = self.get(word)
+        if entries is None:
+            raise KeyError(word)
+        return entries
+
+    def __contains__(self, word) -> bool:
+        return isinstance(word, str) and self._find(word) >= 0
+
+    def __len__(self) -> int:
+        return self._n_words
+
+    def keys(self):
+        return (self._str(sid) for sid in self._words)
+
+    __iter__ = keys
+
+    def posting_count(self) -> int:
+        return self._n_postings
+
+    def entry_counts(self) -> dict:
+        """word -> number of entries, without decoding any postings."""
+        starts = self._word_starts
+        return {self._str(sid): starts[i + 1] - starts[i] for i, sid in enumerate(self._words)}
+
+    def track_names(self) -> dict:
+        """uri -> (artist, track) for every indexed song, without decoding any postings."""
+        tracks = self._tracks
+        return {self._str(tracks[t + 2]): (self._str(tracks[t]), self._str(tracks[t + 1]))
+                for t in range(0, len(tracks), 3)}
+
+    def memory_bytes(self) -> int:
+        """Python-side overhead; the mapped file is paged in by the OS on demand."""
+        views = (self._str_offsets, self._blob, self._tracks, self._lines, self._words,
+                 self._word_starts, self._p_track, self._p_line, self._p_time, self._p_dur,
+                 self._p_off, self._p_score)
+        return sys.getsizeof(self) + sum(sys.getsizeof(v) for v in views if v is not None)
+
+
+# ============ RESIDENT INDEX ============
+
+class WordIndex:
+    """
+    The word index as a resident mapping: word -> [entry, ...].
+
+    Prefers the compact words.idx, unless words.json is newer (rebuilt
+    since the last conversion) or the compact file doesn't exist.
+    """
+
+    def __init__(self, path: Path, compact_path: Path = None):
+        self.path = Path(path)
+        self.compact_path = Path(compact_path) if compact_path else None
+        self._data = None
+        self._signature = None
+        self._lock = threading.Lock()
+        self._footprint = None
+        self._suggest = None
+        self._tracks = None
+        self.loads = 0
+        self.load_ms = 0.0
+
+    def _current_signature(self):
+        """(path, mtime, size) of the newest of words.idx / words.json, or None."""
+        newest = None
+        for path in (self.compact_path, self.path):
+            if path is None:
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            # The compact file wins ties; a rebuilt words.json it wasn't made from doesn't
+            if newest is None or st.st_mtime_ns > newest[1]:
+                newest = (str(path), st.st_mtime_ns, st.st_size)
+        return newest
+
+    def data(self):
+        """The index, reloading first if the file changed on disk."""
+        signature = self._current_signature()
+        if self._data is not None and signature == self._signature:
+            return self._data
+        with self._lock:
+            if self._data is None or signature != self._signature:
+                self._load(signature)
+            return self._data
+
+    def _load(self, signature):
+        t0 = time.perf_counter()
+        data = {}
+        if signature is not None:
+            path = Path(signature[0])
+            if path.suffix != ".idx" and self.compact_path and self.compact_path.exists():
+                print(f"{self.compact_path.name} is older than {path.name}; loading {path.name} "
+                      f"(rebuild with: python3 word_index.py convert)", file=sys.stderr)
+            try:
+                if path.suffix == ".idx":
+                    data = CompactIndex(path)
+                else:
+                    data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                data = {}
+        self._data = data
+        self._signature = signature
+        self._footprint = None
+        self._suggest = None
+        self._tracks = None
+        self.loads += 1
+        self.load_ms = (time.perf_counter() - t0) * 1000
+
+    def suggest(self, word: str, limit: int = 5) -> list:
+        """Ranked 'did you mean' words; the search index is built on first miss."""
+        data = self.data()
+        suggest = self._suggest
+        if suggest is None or suggest[0] is not data:
+            if isinstance(data, CompactIndex):
+                counts = data.entry_counts()
+            else:
+                counts = {w: len(v) for w, v in data.items()}
+            suggest = self._suggest = (data, SuggestIndex(counts, counts))
+        return suggest[1].suggest(word, limit)
+
+    def tracks(self) -> dict:
+        """uri -> (artist, track) for the songs in the index, built on first use."""
+        data = self.data()
+        tracks = self._tracks
+        if tracks is None or tracks[0] is not data:
+            if isinstance(data, CompactIndex):
+                names = data.track_names()
+            else:
+                names = {entry["uri"]: (entry["artist"], entry["track"])
+                         for entries in data.values() for entry in entries}
+            tracks = self._tracks = (data, names)
+        return tracks[1]
+
+    def stats(self) -> dict:
+        data = self.data()
+        if isinstance(data, CompactIndex):
+            entries = data.posting_count()
+            self._footprint = data.memory_bytes()
+        else:
+            entries = sum(len(v) for v in data.values())
+            if self._footprint is None:
+                self._footprint = deep_sizeof(data)
+        return {
+            "format": Path(self._signature[0]).suffix[1:] if self._signature else "none",
+            "words": len(data),
+            "entries": entries,
+            "loads": self.loads,
+            "load_ms": self.load_ms,
+            "file_bytes": self._signature[2] if self._signature else 0,
+            "memory_bytes": self._footprint,
+        }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Word index tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("convert", help="convert words.json to the compact words.idx")
+    p.add_argument("json_path", nargs="?", default=str(Path(__file__).parent / "words.json"))
+    p.add_argument("idx_path", nargs="?", default=str(Path(__file__).parent / "words.idx"))
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    info = convert_json(args.json_path, args.idx_path)
+    print(f"{info['words']} words: {info['json_bytes'] / 1e6:.1f}MB JSON -> "
+          f"{info['idx_bytes'] / 1e6:.1f}MB compact in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()